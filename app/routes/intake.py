@@ -75,10 +75,12 @@ def analyze_transcript(current_user):
     # Build user input for the agent
     user_input = _build_extraction_prompt(transcript, industry_hint)
     
-    # Try to use intake_analyzer agent
+    # Try to use intake_analyzer agent. Extraction depends only on the transcript,
+    # so re-analyzing the same transcript reuses the earlier response.
     result = ai_service.generate_with_agent(
         agent_name='intake_analyzer',
-        user_input=user_input
+        user_input=user_input,
+        cache=True
     )
     
     if result.get('error'):
@@ -404,22 +406,28 @@ def full_pipeline(current_user):
         from app.services.internal_linking_service import internal_linking_service
         service_pages = client.get_service_pages() or []
         
-        # Generate blogs
-        for topic in blog_topics:
+        # Generate blogs concurrently, then save them in topic order
+        usps = client.get_unique_selling_points() or []
+        blog_jobs = [{
+            'keyword': topic['keyword'],
+            'geo': client.geo or '',
+            'industry': client.industry or '',
+            'word_count': topic.get('word_count', 1200),
+            'tone': client.tone or 'professional',
+            'business_name': client.business_name or '',
+            'include_faq': topic.get('include_faq', True),
+            'faq_count': 5,
+            'internal_links': service_pages,
+            'usps': usps
+        } for topic in blog_topics]
+        try:
+            blog_results = ai_service.generate_blog_posts(blog_jobs)
+        except Exception as e:
+            response['errors'].append(f"Blog generation failed: {str(e)}")
+            blog_results = [{'error': 'An error occurred. Please try again.'} for _ in blog_topics]
+        
+        for topic, result in zip(blog_topics, blog_results):
             try:
-                result = ai_service.generate_blog_post(
-                    keyword=topic['keyword'],
-                    geo=client.geo or '',
-                    industry=client.industry or '',
-                    word_count=topic.get('word_count', 1200),
-                    tone=client.tone or 'professional',
-                    business_name=client.business_name or '',
-                    include_faq=topic.get('include_faq', True),
-                    faq_count=5,
-                    internal_links=service_pages,
-                    usps=client.get_unique_selling_points() or []
-                )
-                
                 if not result.get('error'):
                     # Process with internal linking
                     body_content = result.get('body', '')
@@ -271,6 +271,15 @@ Format your response as JSON:
 ]
 
 
+def _clear_generation_cache(agent_name: str):
+    """Drop ai_service's cached copy of an agent so edits apply to the next generation"""
+    try:
+        from app.services.ai_service import clear_agent_cache
+        clear_agent_cache(agent_name)
+    except Exception as e:
+        logger.debug(f"Could not clear agent cache for {agent_name}: {e}")
+
+
 class AgentService:
     """Service for managing AI agent configurations"""
     
@@ -411,6 +420,7 @@ class AgentService:
         
         try:
             db.session.commit()
+            _clear_generation_cache(agent.name)
             logger.info(f"Updated agent {agent.name} to version {agent.version}")
             return {'agent': agent.to_dict()}
         except Exception as e:
@@ -460,6 +470,7 @@ class AgentService:
         
         try:
             db.session.commit()
+            _clear_generation_cache(agent.name)
             logger.info(f"Rolled back agent {agent.name} to version {version.version}")
             return {'agent': agent.to_dict(), 'rolled_back_to': version.version}
         except Exception as e:
@@ -601,6 +612,7 @@ class AgentService:
         try:
             db.session.add(new_agent)
             db.session.commit()
+            _clear_generation_cache(new_agent.name)
             return {'agent': new_agent.to_dict()}
         except Exception as e:
             db.session.rollback()
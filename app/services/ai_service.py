@@ -5,20 +5,982 @@ OpenAI and Anthropic API integration for content generation
 import os
 import json
 import time
+import random
+import hashlib
+import asyncio
 import re
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+import traceback
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Callable
+from urllib.parse import urljoin, urlparse
+import anthropic
 import requests
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
+# orjson parses large model responses several times faster than stdlib json.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so existing handlers still apply.
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+    _json_loads = orjson.loads
+except ImportError:
+    ORJSON_AVAILABLE = False
+    _json_loads = json.loads
+    logger.info("orjson not installed, using stdlib json for response parsing")
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+    logger.info("beautifulsoup4 not installed, blog page scraping disabled")
+
+# Service singletons used on every blog generation. Neither module imports
+# ai_service at load time, but guard anyway so a partial install still imports.
+try:
+    from app.services.agent_service import agent_service
+except ImportError:
+    agent_service = None
+try:
+    from app.services.internal_linking_service import internal_linking_service
+except ImportError:
+    internal_linking_service = None
+try:
+    from app.services.token_tracker import track_usage
+except ImportError:
+    track_usage = None
+
+# Models for related-post lookups (agent_service already loads them)
+try:
+    from sqlalchemy import func, or_
+    from app.models.db_models import DBBlogPost, DBClient, DBServicePage
+except ImportError:
+    DBBlogPost = DBClient = DBServicePage = None
+
+# Shared Claude rate-limit cooldown: once any call is rate limited, every other
+# call in this process waits it out instead of hitting the same 429.
+_COOLDOWN_LOCK = threading.Lock()
+_ANTHROPIC_COOLDOWN_UNTIL = 0.0  # time.monotonic() value
+
+
+# Client-side Claude rate limits per model: requests and input tokens per minute.
+# Calls proceed immediately while budget remains and only wait once it runs out.
+_CLAUDE_RPM = int(os.environ.get('CLAUDE_RPM', 50))
+_CLAUDE_INPUT_TPM = int(os.environ.get('CLAUDE_INPUT_TPM', 30000))
+
+
+class _TokenBucket:
+    """Thread-safe token bucket refilled continuously at per_minute / 60 per second"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, n: float) -> float:
+        """Take n tokens now and return how many seconds to wait before using them"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            # A single request larger than the bucket would otherwise never fit
+            self.tokens -= min(n, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+
+_RATE_LIMIT_BUCKETS: Dict[str, tuple] = {}
+_RATE_LIMIT_BUCKETS_LOCK = threading.Lock()
+
+
+def _rate_limit_wait(model: str, input_tokens: int) -> float:
+    """Reserve one request and input_tokens for model; returns seconds to wait first"""
+    buckets = _RATE_LIMIT_BUCKETS.get(model)
+    if buckets is None:
+        with _RATE_LIMIT_BUCKETS_LOCK:
+            buckets = _RATE_LIMIT_BUCKETS.setdefault(
+                model, (_TokenBucket(_CLAUDE_RPM), _TokenBucket(_CLAUDE_INPUT_TPM))
+            )
+    requests_bucket, tokens_bucket = buckets
+    return max(requests_bucket.reserve(1), tokens_bucket.reserve(input_tokens))
+
+
+# Most Claude calls one concurrent fan-out (social kit, blog posts) keeps in flight
+_LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+
+
+async def _gather_limited(coros) -> list:
+    """asyncio.gather, running at most _LLM_MAX_CONCURRENCY of the coroutines at once"""
+    semaphore = asyncio.Semaphore(_LLM_MAX_CONCURRENCY)
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*[run(coro) for coro in coros])
+
+
+def _require_no_running_loop(async_variant: str):
+    """Sync fan-out helpers run their own event loop; inside a running one they would block it"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError(f"Called from a running event loop; await AIService.{async_variant}() instead")
+
+
+# Successful Claude responses for callers that opt in with cache=True, such as intake
+# transcript extraction, where identical input should give the same answer. Off by
+# default so re-running an analysis or "regenerate" always gives fresh output.
+# Format: {blake2b(model|temperature|max_tokens|system|prompt): {'response': dict, 'ts': float}}
+# Shared by every request thread in the worker, so all access holds the lock.
+_RESPONSE_CACHE: Dict[str, dict] = {}
+_RESPONSE_CACHE_LOCK = threading.Lock()
+_RESPONSE_CACHE_TTL = 3600  # seconds
+_RESPONSE_CACHE_MAX_ENTRIES = 256
+
+
+def _response_cache_key(model: str, temperature: float, max_tokens: int, system_prompt: str, prompt: str) -> str:
+    raw = f"{model}|{temperature}|{max_tokens}|{system_prompt}|{prompt}"
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _response_cache_get(key: str) -> Optional[Dict[str, Any]]:
+    with _RESPONSE_CACHE_LOCK:
+        cached = _RESPONSE_CACHE.pop(key, None)
+        if not cached or (time.time() - cached['ts']) >= _RESPONSE_CACHE_TTL:
+            return None
+        # Re-insert so the entry counts as most recently used
+        _RESPONSE_CACHE[key] = cached
+    logger.info("Claude response served from cache")
+    return dict(cached['response'])
+
+
+def _response_cache_put(key: str, response: Dict[str, Any]):
+    entry = {'response': dict(response), 'ts': time.time()}
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE.pop(key, None)
+        if len(_RESPONSE_CACHE) >= _RESPONSE_CACHE_MAX_ENTRIES:
+            # Drop the least recently used entry (dicts keep insertion order)
+            _RESPONSE_CACHE.pop(next(iter(_RESPONSE_CACHE)), None)
+        _RESPONSE_CACHE[key] = entry
+
+
+def _response_cache_discard(key: str):
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE.pop(key, None)
+
+
+def clear_response_cache():
+    """Drop all cached Claude responses"""
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE.clear()
+
+
+# Rate-limit backoff when the API gives no Retry-After: base * 2^attempt, jittered, capped
+_RETRY_BASE_SECONDS = 5
+_RETRY_MAX_SECONDS = 60
+
+
+def _set_anthropic_cooldown(seconds: float):
+    """Hold off all Claude calls for at least the given number of seconds"""
+    global _ANTHROPIC_COOLDOWN_UNTIL
+    with _COOLDOWN_LOCK:
+        _ANTHROPIC_COOLDOWN_UNTIL = max(_ANTHROPIC_COOLDOWN_UNTIL, time.monotonic() + seconds)
+
+
+def _anthropic_cooldown_remaining() -> float:
+    """Seconds left on the shared Claude cooldown (0 when calls may proceed)"""
+    return max(0.0, _ANTHROPIC_COOLDOWN_UNTIL - time.monotonic())
+
+# Agent config cache — agent prompts change rarely compared to generation volume.
+# Format: {agent_name: {'agent': _CachedAgent, 'ts': float}}
+# Only found agents are cached, so a newly created agent is usable immediately.
+# Entries are cleared by agent_service on update/rollback/duplicate; the TTL bounds
+# staleness in other gunicorn workers that didn't see the edit.
+_AGENT_CACHE: Dict[str, dict] = {}
+_AGENT_CACHE_TTL = 60  # seconds
+
+
+@dataclass(frozen=True)
+class _CachedAgent:
+    """Detached copy of the DBAgentConfig fields used for generation"""
+    name: str
+    system_prompt: str
+    model: str
+    temperature: float
+    max_tokens: int
+
+
+def _get_agent(name: str) -> Optional[_CachedAgent]:
+    """Get an agent config by name, served from a short-lived in-memory cache"""
+    cached = _AGENT_CACHE.get(name)
+    if cached and (time.time() - cached['ts']) < _AGENT_CACHE_TTL:
+        return cached['agent']
+
+    db_agent = agent_service.get_agent(name) if agent_service else None
+    if not db_agent:
+        return None
+    # Copy plain values so the cache never holds an ORM instance across sessions
+    agent = _CachedAgent(
+        name=db_agent.name,
+        system_prompt=db_agent.system_prompt or '',
+        model=db_agent.model,
+        temperature=db_agent.temperature,
+        max_tokens=db_agent.max_tokens
+    )
+    _AGENT_CACHE[name] = {'agent': agent, 'ts': time.time()}
+    return agent
+
+
+def clear_agent_cache(name: str = None):
+    """Clear cached agent config for one agent or all agents"""
+    if name:
+        _AGENT_CACHE.pop(name, None)
+    else:
+        _AGENT_CACHE.clear()
+    _render_agent_prompt.cache_clear()
+
+
+# Related-post lookups (blog page scrape plus DB queries) per client and keyword.
+# Entries are cleared when a blog post is published; the TTL bounds staleness otherwise.
+# Format: {(client_id, keyword_lower, limit): {'posts': list, 'ts': float}}
+_RELATED_POSTS_CACHE: Dict[tuple, dict] = {}
+_RELATED_POSTS_CACHE_LOCK = threading.Lock()
+_RELATED_POSTS_CACHE_TTL = 300  # seconds
+_RELATED_POSTS_CACHE_MAX_ENTRIES = 512
+
+
+def _related_posts_cache_get(key: tuple) -> Optional[List[Dict]]:
+    with _RELATED_POSTS_CACHE_LOCK:
+        cached = _RELATED_POSTS_CACHE.pop(key, None)
+        if not cached or (time.time() - cached['ts']) >= _RELATED_POSTS_CACHE_TTL:
+            return None
+        # Re-insert so the entry counts as most recently used
+        _RELATED_POSTS_CACHE[key] = cached
+    return list(cached['posts'])
+
+
+def _related_posts_cache_put(key: tuple, posts: List[Dict]):
+    entry = {'posts': posts, 'ts': time.time()}
+    with _RELATED_POSTS_CACHE_LOCK:
+        _RELATED_POSTS_CACHE.pop(key, None)
+        if len(_RELATED_POSTS_CACHE) >= _RELATED_POSTS_CACHE_MAX_ENTRIES:
+            # Drop the least recently used entry (dicts keep insertion order)
+            _RELATED_POSTS_CACHE.pop(next(iter(_RELATED_POSTS_CACHE)), None)
+        _RELATED_POSTS_CACHE[key] = entry
+
+
+def clear_related_posts_cache(client_id: str = None):
+    """Clear cached related posts for one client or all clients"""
+    with _RELATED_POSTS_CACHE_LOCK:
+        if client_id:
+            for key in [k for k in _RELATED_POSTS_CACHE if k[0] == client_id]:
+                _RELATED_POSTS_CACHE.pop(key, None)
+        else:
+            _RELATED_POSTS_CACHE.clear()
+
+
+# {variable} placeholders in agent prompts. Agent prompts also contain literal JSON
+# ({"key": ...}), which rules out str.format_map — this only matches bare {word} tokens.
+_PROMPT_VAR_RE = re.compile(r'\{(\w+)\}')
+
+
+def _substitute_prompt_vars(template: str, variables: Dict[str, Any]) -> str:
+    """Replace {name} placeholders in one pass; unknown placeholders are left as-is"""
+    if not variables:
+        return template
+    return _PROMPT_VAR_RE.sub(
+        lambda m: str(variables[m.group(1)]) if m.group(1) in variables else m.group(0),
+        template
+    )
+
+
+@lru_cache(maxsize=64)
+def _render_agent_prompt(template: str, tone: str, industry: str) -> str:
+    """Substitute {tone}/{industry} into an agent system prompt (memoized per combination)"""
+    return _substitute_prompt_vars(template, {'tone': tone, 'industry': industry})
+
+
+# System prompt for Claude calls that don't supply their own
+_DEFAULT_SYSTEM_PROMPT = 'You are an expert SEO content writer. Always respond with valid JSON when requested. Never wrap JSON in markdown code blocks.'
+
+# Default system prompt for blog generation (overridden by the content_writer agent)
+_BLOG_SYSTEM_PROMPT = '''You are an SEO content engine generating high-conversion local service blog posts.
+
+CRITICAL LOCATION RULES (MUST FOLLOW):
+1. The PRIMARY KEYWORD may already contain a city or service area.
+2. If the city name appears in the primary keyword, DO NOT repeat the city again in:
+   - Headings
+   - Titles
+   - Introductions
+   - H1/H2/H3
+3. The city + state may appear ONCE for clarity only if it improves readability.
+4. NEVER output patterns like:
+   "Service City in City, State"
+   "Keyword City for City Residents"
+
+HEADLINE RULES:
+- Convert ALL headlines to Proper Case (Title Case).
+- Never leave headlines in lowercase.
+- H1 must be human-readable, not keyword-stuffed.
+
+OUTPUT FORMAT:
+- Output ONLY valid JSON - no markdown, no code blocks, no explanations
+- Follow the exact JSON structure requested
+
+You are generating content for legitimate local service businesses (HVAC, plumbing, dental, etc.).'''
+
+# Blog writing instructions, identical for every post. They are appended to the blog
+# system prompt so the whole block is one cacheable prefix (see _system_param); the
+# per-post values arrive in the short _BLOG_PROMPT_TEMPLATE user message.
+_BLOG_INSTRUCTIONS = """BLOG POST INSTRUCTIONS
+Each request gives BLOG DETAILS: WORD COUNT, TOPIC (the primary keyword), COMPANY, CITY and STATE, contact details and internal links.
+Below, <<WORD_COUNT>>, <<TOPIC>>, <<COMPANY>>, <<CITY>>, <<STATE>>, <<PHONE>> and <<EMAIL>> stand for those values. Always write the actual value, never the token itself.
+
+TARGET: <<WORD_COUNT>> words minimum (this is CRITICAL - count your words!)
+
+REQUIRED ARTICLE STRUCTURE:
+Write each section with the specified word count.
+CRITICAL: At least 3 of your H2 headings MUST contain the keyword "<<TOPIC>>" (or its core words) naturally.
+Example good headings: "Benefits of <<TOPIC>>", "How <<TOPIC>> Works", "Cost of <<TOPIC>> in <<CITY>>"
+Example bad headings: "Benefits", "Our Process", "Pricing" (these are too generic and hurt SEO score)
+
+<h2>Your Guide to <<TOPIC>> in <<CITY>></h2> (250 words)
+Write 250 words introducing <<TOPIC>> services in <<CITY>>. Use the keyword "<<TOPIC>>" naturally within the first 2 sentences.
+
+<h2>Top Benefits of <<TOPIC>></h2> (300 words)
+Write 300 words covering 3 key benefits, each as an H3 subheading:
+- <h3>Benefit 1 related to <<TOPIC>></h3> - 100 words
+- <h3>Benefit 2 related to <<TOPIC>></h3> - 100 words
+- <h3>Benefit 3 related to <<TOPIC>></h3> - 100 words
+
+<h2>How <<COMPANY>> Handles <<TOPIC>></h2> (200 words)
+Write 200 words explaining the process. Include internal links here.
+
+<h2><<TOPIC>> Cost and Pricing Factors</h2> (200 words)
+Write 200 words about what affects pricing for <<TOPIC>> in <<CITY>>.
+
+<h2>Why Choose <<COMPANY>> for <<TOPIC>></h2> (200 words)
+Write 200 words about why <<COMPANY>> is the best choice. Include contact information and internal links.
+
+<h2>Frequently Asked Questions About <<TOPIC>></h2> (200 words)
+Write 5 Q&A pairs about <<TOPIC>>.
+
+<h2>Get Started with <<TOPIC>> Today</h2> (150 words)
+Write 150 words with a strong call-to-action. Include phone and email.
+
+**CRITICAL SEO REQUIREMENTS (each one affects the score):**
+1. WORD COUNT: <<WORD_COUNT>>+ words minimum
+2. KEYWORD IN HEADINGS: At least 3 of your H2/H3 headings must contain "<<TOPIC>>" or its core words
+3. KEYWORD IN FIRST 100 WORDS: Use "<<TOPIC>>" in the very first paragraph
+4. KEYWORD DENSITY: Use "<<TOPIC>>" naturally 8-15 times throughout the article (target 1-2% density)
+5. INTERNAL LINKS: Insert at least 5 links using <a href="URL">anchor text</a> format. Spread them across multiple sections.
+   Use the links listed in BLOG DETAILS.
+6. META TITLE: 55-60 characters, must contain "<<TOPIC>>" — e.g. "<<TOPIC>> | <<COMPANY>>"
+7. META DESCRIPTION: 150-160 characters, must contain "<<TOPIC>>"
+8. HEADINGS: Use at least 5 H2 tags and 3 H3 tags in the body
+9. Location: Use ONLY <<CITY>>, <<STATE>> - no other cities
+
+Return ONLY valid JSON:
+{"meta_title": "[55-60 chars, must include <<TOPIC>>]",
+"meta_description": "[150-160 chars, must include <<TOPIC>> in lowercase]",
+"h1": "<<TOPIC>> - Trusted <<CITY>> Experts | <<COMPANY>>",
+"body": "<h2>Your Guide to <<TOPIC>> in <<CITY>></h2><p>... include <a href='URL'>links</a> ...</p>...",
+"faq_items": [
+  {"question": "How much does <<TOPIC>> cost in <<CITY>>?", "answer": "Costs vary by project. Contact <<COMPANY>> at <<PHONE>> for a free estimate."},
+  {"question": "How long does <<TOPIC>> take?", "answer": "Most jobs take 1-3 days. <<COMPANY>> provides accurate timelines during consultation."},
+  {"question": "Is <<COMPANY>> licensed and insured?", "answer": "Yes, <<COMPANY>> is fully licensed and insured to serve <<CITY>>."},
+  {"question": "Do you offer emergency service?", "answer": "Yes, contact <<COMPANY>> anytime for emergency <<TOPIC>>."},
+  {"question": "What areas do you serve?", "answer": "<<COMPANY>> proudly serves <<CITY>> and surrounding areas in <<STATE>>."}
+],
+"cta": {"company_name": "<<COMPANY>>", "phone": "<<PHONE>>", "email": "<<EMAIL>>"}
+}
+Write FAQ questions with the topic in lowercase. When no phone is given, say "our office" in answers and leave the cta phone empty; likewise leave the cta email empty when none is given.
+
+REMEMBER: Body must have <<WORD_COUNT>>+ words, at least 5 internal <a href> links, and keyword "<<TOPIC>>" in 3+ headings!"""
+
+# Per-post blog details, rendered with %-style named slots by _render_blog_prompt.
+_BLOG_PROMPT_TEMPLATE = """BLOG DETAILS
+WORD COUNT: %(word_count)s
+TOPIC: %(primary_keyword)s
+COMPANY: %(business_name)s
+CITY: %(city)s
+STATE: %(state)s
+PHONE: %(phone)s
+EMAIL: %(email)s
+%(contact_info)s
+%(links_text)s
+%(links_instruction)s
+
+Write the %(word_count)s-word blog post about "%(primary_keyword)s" for %(business_name)s in %(city)s, %(state)s, following the BLOG POST INSTRUCTIONS."""
+
+_TITLE_CASE_MINOR_WORDS = frozenset({'a', 'an', 'the', 'and', 'but', 'or', 'for', 'nor',
+                                     'on', 'at', 'to', 'by', 'in', 'of', 'with', 'as'})
+
+
+def _to_title_case(text: str) -> str:
+    """Title Case that keeps minor words (a, of, in, ...) lowercase"""
+    if not text:
+        return text
+    words = text.split()
+    return ' '.join(
+        word.capitalize() if i == 0 or word.lower() not in _TITLE_CASE_MINOR_WORDS else word.lower()
+        for i, word in enumerate(words)
+    )
+
+
+def _blog_links_sections(all_links: List[Dict]) -> tuple:
+    """Build the numbered link list and inline <a> examples for the blog prompt"""
+    if not all_links:
+        return '', ''
+    links = all_links[:6]
+    links_text = 'INTERNAL LINKS TO INSERT (REQUIRED - add at least 3):\n' + ''.join(
+        f"{i}. {link['title']}: {link['url']}\n" for i, link in enumerate(links, 1)
+    )
+    links_html_examples = ', '.join(
+        f'<a href="{link["url"]}">{link["title"]}</a>' for link in links[:3]
+    )
+    return links_text, links_html_examples
+
+
+# Known cities to detect in keywords (includes common Florida cities)
+_KNOWN_CITIES = (
+    'sarasota', 'port charlotte', 'fort myers', 'naples', 'tampa', 'orlando',
+    'jacksonville', 'miami', 'bradenton', 'venice', 'punta gorda', 'north port',
+    'cape coral', 'bonita springs', 'estero', 'lehigh acres', 'englewood',
+    'arcadia', 'nokomis', 'osprey', 'lakewood ranch', 'palmetto', 'ellenton',
+    'parrish', 'ruskin', 'sun city center', 'apollo beach', 'brandon', 'riverview'
+)
+
+
+@lru_cache(maxsize=256)
+def _detect_cities(keyword: str, geo: str) -> tuple:
+    """
+    Work out which city the blog is about.
+    Returns (keyword_city, settings_city): the city named in the keyword (or None)
+    and the city from the client's geo setting.
+    """
+    # Also add the geo city from the geo string
+    known_cities = _KNOWN_CITIES
+    geo_city_lower = (geo.split(',')[0].strip().lower() if geo else '')
+    if geo_city_lower and geo_city_lower not in known_cities:
+        known_cities = known_cities + (geo_city_lower,)
+
+    # Check if keyword already contains a city name (check longest first for multi-word cities)
+    keyword_lower = keyword.lower()
+    keyword_city = None
+    for test_city in sorted(known_cities, key=len, reverse=True):
+        if test_city in keyword_lower:
+            keyword_city = test_city.title()
+            break
+
+    # Parse geo from settings
+    geo_parts = geo.split(',') if geo else ['', '']
+    settings_city = geo_parts[0].strip() if len(geo_parts) > 0 else ''
+
+    return keyword_city, settings_city
+
+
+@lru_cache(maxsize=256)
+def _render_blog_prompt(word_count, primary_keyword, business_name, city, state,
+                        contact_info, links_text, links_html_examples, phone, email) -> str:
+    """Fill _BLOG_PROMPT_TEMPLATE; identical inputs reuse the rendered string"""
+    if links_html_examples:
+        links_instruction = 'Links to use: ' + links_html_examples
+    else:
+        links_instruction = 'Use links like: <a href="/services">our services</a>, <a href="/contact">contact us</a>'
+    return _BLOG_PROMPT_TEMPLATE % {
+        'word_count': word_count,
+        'primary_keyword': primary_keyword,
+        'business_name': business_name,
+        'city': city,
+        'state': state,
+        'contact_info': contact_info,
+        'links_text': links_text,
+        'links_instruction': links_instruction,
+        'phone': phone,
+        'email': email,
+    }
+
+
+def _faq_schema(faq_items: List[Dict]) -> Dict[str, Any]:
+    """FAQPage JSON-LD built from faq_items, so the model doesn't have to write it out twice"""
+    return {
+        "@context": "https://schema.org",
+        "@type": "FAQPage",
+        "mainEntity": [
+            {
+                "@type": "Question",
+                "name": faq.get('question') or faq.get('q', ''),
+                "acceptedAnswer": {
+                    "@type": "Answer",
+                    "text": faq.get('answer') or faq.get('a', '')
+                }
+            }
+            for faq in faq_items
+            if (faq.get('question') or faq.get('q')) and (faq.get('answer') or faq.get('a'))
+        ]
+    }
+
+# HTML stripping for word counts
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def _count_words_in_html(html_str: str) -> int:
+    """Count the words in the visible text of an HTML fragment"""
+    if not html_str:
+        return 0
+    return len(_TAG_RE.sub(' ', html_str).split())
+
+# Placeholder text that means the model echoed the prompt skeleton instead of writing
+_PLACEHOLDER_PATTERNS = [
+    'Question 1 about', 'Question 2 about', 'Question 3 about', 
+    'Question 4 about', 'Question 5 about',
+    'Answer to question 1', 'Answer to question 2', 'Answer to question 3',
+    'Answer to question 4', 'Answer to question 5',
+    'Answer 1', 'Answer 2', 'Answer 3', 'Answer 4', 'Answer 5',
+    'Response...', 'Insight...', 'Explanation...', 'Advice...', 
+    'Information...', 'Clarification...', 'CTA section...', 
+    'Content...', 'Details...', 'Details here', 'Content here',
+    'Full HTML content', 'WRITE', 'DO NOT put placeholder',
+    '[specific', '[factor', '[qualification', '[shorter time]',
+    'MANDATORY:', '[COUNT YOUR WORDS', '[60-80 word',
+    'Write 100+ words', 'Write 80+ words', 'Write 40+ words',
+    '40-60 word answer', 'Real specific question',
+    '<FULL HTML', '<THE FULL HTML',
+    '<<TOPIC>>', '<<COMPANY>>', '<<CITY>>'
+]
+_PLACEHOLDER_MAX_LEN = max(len(p) for p in _PLACEHOLDER_PATTERNS)
+
+# All patterns are matched in one pass over the lowercased text
+_PLACEHOLDER_RE = re.compile('|'.join(re.escape(p.lower()) for p in _PLACEHOLDER_PATTERNS))
+_PLACEHOLDER_BY_LOWER = {p.lower(): p for p in _PLACEHOLDER_PATTERNS}
+
+# Rough characters per Claude token for English prose and HTML
+_CHARS_PER_TOKEN = 4
+
+
+def _estimate_tokens(text: str) -> int:
+    """
+    Approximate the Claude token count of text without an API round-trip.
+    Only used for rate-limit budgeting and the prompt-cache threshold, where
+    being off by a few percent doesn't matter.
+    """
+    if not text:
+        return 0
+    return len(text) // _CHARS_PER_TOKEN
+
+
+# Anthropic only caches prompt prefixes of at least this many tokens (Sonnet/Opus)
+_PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+def _system_param(system_prompt: str):
+    """
+    The `system` value for a Claude request. System prompts long enough to be
+    cached are sent as a block marked for prompt caching, so repeat calls with the
+    same agent/tone/industry prompt are billed at the cached-read rate.
+    """
+    if _estimate_tokens(system_prompt) < _PROMPT_CACHE_MIN_TOKENS:
+        return system_prompt
+    return [{'type': 'text', 'text': system_prompt, 'cache_control': {'type': 'ephemeral'}}]
+
+
+# H2 location fix-up: headings are matched by word, not substring
+_H2_RE = re.compile(r'<h2>([^<]+)</h2>')
+_WORD_RE = re.compile(r'\w+')
+_H2_QUESTION_WORDS = frozenset({'why', 'how', 'what'})
+_H2_BENEFIT_WORDS = frozenset({'benefits', 'advantages'})
+_H2_COST_WORDS = frozenset({'cost', 'costs', 'price', 'prices'})
+
+# _parse_blog_response patterns
+_JSON_DECODER = json.JSONDecoder()
+# Model output often has raw newlines inside strings, which strict decoding rejects
+_LENIENT_JSON_DECODER = json.JSONDecoder(strict=False)
+_JSON_GUARD_WINDOW = 64
+_STRAY_TAG_BACKSLASH_RE = re.compile(r'\\+([<>])')
+_ESCAPED_CHAR_RE = re.compile(r'\\([^\\])')
+_BODY_STRING_RE = re.compile(r'"body"\s*:\s*"((?:[^"\\]|\\.)*)"|"body"\s*:\s*`((?:[^`\\]|\\.)*)`', re.DOTALL)
+_JSON_PUNCT_TT = str.maketrans('', '', '{}[]"')
+_KEY_STRIP_RE = re.compile(r'(title|h1|meta_title|meta_description|body|h2_headings|h3_headings|faq_items|secondary_keywords|word_count)\s*:')
+_P_RE = re.compile(r'<p>.*?</p>', re.DOTALL)
+
+_JSON_STRUCTURE_RE = re.compile(r'[\\"{}\[\],]')
+# What may follow the closing quote of a string value in well-formed JSON
+_STRING_VALUE_CLOSE_RE = re.compile(r'\s*[,}]')
+# A closing quote followed by the next key (e.g. ", "h2_headings":) or the end of the object
+_STRING_VALUE_END_RE = re.compile(r'"\s*(?:,\s*"[A-Za-z_]+"\s*:|})')
+_CODE_FENCE_OPEN_RE = re.compile(r'```[A-Za-z]*[ \t]*\n?')
+# A decoded object counts as the blog only if it has one of these keys
+_BLOG_OBJECT_KEYS = frozenset({'title', 'h1', 'body', 'content', 'html', 'article', 'meta_title'})
+_BLOG_DECODE_MAX_ATTEMPTS = 8
+
+# _fix_duplicate_cities patterns
+_CITY_AFTER_IN_RE = re.compile(r'in\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?),?\s*([A-Z]{2})?')
+_CITY_BEFORE_STATE_RE = re.compile(r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?),\s*(?:FL|Florida|TX|Texas|CA|California|[A-Z]{2})')
+_TRAILING_IN_RE = re.compile(r'\s+in\s*$')
+_MULTI_SPACE_RE = re.compile(r'\s{2,}')
+_COMMON_CITIES = ('Port Charlotte', 'Sarasota', 'Fort Myers', 'Naples', 'Tampa', 'Orlando',
+                  'Jacksonville', 'Miami', 'Bradenton', 'Venice', 'Punta Gorda', 'North Port',
+                  'Cape Coral', 'Bonita Springs', 'Estero', 'Lehigh Acres')
+
+
+@lru_cache(maxsize=64)
+def _duplicate_city_patterns(city: str) -> tuple:
+    """Compiled (pattern, replacement) pairs that collapse repeated mentions of city"""
+    city_escaped = re.escape(city.title())
+    patterns = [
+        # "in Port Charlotte? in Port Charlotte" or "in Port Charlotte? in Port"
+        (rf'(in\s+{city_escaped}[?!.,]?)\s+in\s+{city_escaped}', r'\1'),
+        # "in Port Charlotte in Port Charlotte" -> "in Port Charlotte"
+        (rf'(in\s+{city_escaped})\s+in\s+{city_escaped}', r'\1'),
+        # "Port Charlotte? in Port" (partial at end)
+        (rf'({city_escaped}[?!.,]?)\s+in\s+Port\b', r'\1'),
+        # "Port Charlotte Port Charlotte" -> "Port Charlotte"
+        (rf'({city_escaped})\s+{city_escaped}', r'\1'),
+        # "Port Charlotte in Port Charlotte" -> "Port Charlotte"
+        (rf'({city_escaped})\s+in\s+{city_escaped}', r'\1'),
+        # "Port Charlotte for Port Charlotte" -> "Port Charlotte"
+        (rf'({city_escaped})\s+for\s+{city_escaped}', r'\1'),
+        # "Port Charlotte, FL in Port Charlotte" -> "Port Charlotte, FL"
+        (rf'({city_escaped},?\s*(?:FL|Florida)?)\s+in\s+{city_escaped}', r'\1'),
+        # "for Port Charlotte in Port Charlotte" -> "for Port Charlotte"
+        (rf'(for\s+{city_escaped})\s+in\s+{city_escaped}', r'\1'),
+    ]
+    if 'port' in city.lower():
+        # Handle truncated city at end: "in Port$" when city is "Port Charlotte"
+        patterns.append((r'in\s+Port\s*$', ''))
+    return tuple((re.compile(pattern, re.IGNORECASE), replacement) for pattern, replacement in patterns)
+
+
+def _strip_code_fence(text: str) -> str:
+    """
+    Contents of a ``` fenced block that opens before the JSON (to the end of text if
+    the fence was never closed), otherwise text unchanged. Fences inside the JSON,
+    e.g. a code sample in the body, are left alone.
+    """
+    fence = text.find('```')
+    if fence == -1 or -1 < text.find('{') < fence:
+        return text
+    start = _CODE_FENCE_OPEN_RE.match(text, fence).end()
+    end = text.find('```', start)
+    return text[start:end] if end != -1 else text[start:]
+
+
+def _decode_blog_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    raw_decode the first complete blog object in text, trying each { in turn so
+    braces in chatter around the JSON (e.g. "{tone}") are skipped.
+    """
+    pos = text.find('{')
+    for _ in range(_BLOG_DECODE_MAX_ATTEMPTS):
+        if pos == -1:
+            return None
+        try:
+            data, _ = _JSON_DECODER.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict) and not _BLOG_OBJECT_KEYS.isdisjoint(data):
+            return data
+        pos = text.find('{', pos + 1)
+    return None
+
+
+def _unescape_json_string(raw: str) -> str:
+    """
+    Decode the escapes in a raw JSON string body (\\n, \\", \\uXXXX, ...) in one
+    pass. Falls back to unescaping quotes, newlines and slashes when the text
+    is not a valid JSON string, e.g. a truncated trailing escape.
+    """
+    try:
+        return _LENIENT_JSON_DECODER.decode('"' + raw + '"')
+    except ValueError:
+        return raw.replace('\\"', '"').replace('\\n', '\n').replace('\\/', '/')
+
+
+def _is_escaped(text: str, pos: int, start: int) -> bool:
+    """True when the character at pos follows an odd run of backslashes (after start)"""
+    j = pos
+    while j > start and text[j - 1] == '\\':
+        j -= 1
+    return (pos - j) % 2 == 1
+
+
+def _extract_string_value(text: str, key: str) -> Optional[str]:
+    """
+    Return the raw (still escaped) string value of "key" from malformed JSON, or
+    None when the key is missing or its string is never closed. Walks the literal
+    directly instead of running a backtracking regex over the whole response.
+    
+    If the first unescaped quote isn't followed by , or } it sits inside the value
+    (usually an unescaped href="..."), so the value runs to the next key instead.
+    """
+    needle = f'"{key}"'
+    n = len(text)
+    idx = text.find(needle)
+    while idx != -1:
+        i = idx + len(needle)
+        while i < n and text[i] in ' \t\r\n':
+            i += 1
+        if i < n and text[i] == ':':
+            i += 1
+            while i < n and text[i] in ' \t\r\n':
+                i += 1
+            if i < n and text[i] == '"':
+                start = end = i + 1
+                while True:
+                    end = text.find('"', end)
+                    if end == -1:
+                        return None
+                    if not _is_escaped(text, end, start):
+                        break
+                    end += 1
+                if _STRING_VALUE_CLOSE_RE.match(text, end + 1):
+                    return text[start:end]
+                for match in _STRING_VALUE_END_RE.finditer(text, end):
+                    if not _is_escaped(text, match.start(), start):
+                        return text[start:match.start()]
+                return None
+        idx = text.find(needle, idx + 1)
+    return None
+
+
+def _recover_truncated_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Salvage a JSON object that was cut off before its closing brace: keep every
+    top-level member completed before the cut and close the object. Returns None
+    when the object isn't truncated or no body survives.
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    skip_to = -1
+    cut = None
+    # Only quotes, escapes, brackets and commas change state, so jump between those
+    for match in _JSON_STRUCTURE_RE.finditer(text, start):
+        i = match.start()
+        if i < skip_to:
+            continue
+        ch = text[i]
+        if in_string:
+            if ch == '\\':
+                skip_to = i + 2
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '{[':
+            depth += 1
+        elif ch in '}]':
+            depth -= 1
+            if depth == 0:
+                return None  # Complete object — the parse failed for another reason
+        elif ch == ',' and depth == 1:
+            cut = i
+    if cut is None:
+        return None
+    try:
+        data = _json_loads(text[start:cut] + '}')
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not data.get('body'):
+        return None
+    return data
+
+
+# How much new streamed text (or time) to accumulate before running a stream_check callback
+_STREAM_CHECK_INTERVAL = 2000
+_STREAM_CHECK_SECONDS = 5
+
+# Keys the blog body may stream under (_parse_blog_response accepts all of them)
+_STREAM_BODY_KEYS = ('"body"', '"content"', '"html"', '"article"')
+
+# A blog stream still producing fewer than this many tokens per second after
+# _SLOW_STREAM_SECONDS has stalled, and is abandoned and retried
+_SLOW_STREAM_SECONDS = 30
+_SLOW_STREAM_MIN_TOKENS_PER_SECOND = 8
+_SLOW_STREAM_REASON = 'too slow'
+
+
+def _find_placeholder(text: str) -> Optional[str]:
+    """Return the first placeholder pattern found in text (case-insensitive), or None"""
+    match = _PLACEHOLDER_RE.search(text.lower())
+    return _PLACEHOLDER_BY_LOWER[match.group(0)] if match else None
+
+
+def _stream_body_start(partial: str) -> int:
+    """Offset of the first body key in a streamed blog response, or -1"""
+    starts = [i for i in (partial.find(key) for key in _STREAM_BODY_KEYS) if i != -1]
+    return min(starts) if starts else -1
+
+
+def _body_placeholder_check(partial: str, new_from: int, elapsed: float = 0) -> Optional[str]:
+    """
+    stream_check callback: watch the streamed body value for placeholder text.
+    Only text from new_from onward (plus a small overlap) is scanned on each call.
+    """
+    body_start = _stream_body_start(partial)
+    if body_start == -1:
+        return None
+    body_end = partial.find('"faq_items"', body_start)
+    if body_end == -1:
+        body_end = len(partial)
+    scan_from = max(body_start, new_from - _PLACEHOLDER_MAX_LEN)
+    hit = _find_placeholder(partial[scan_from:body_end])
+    if hit:
+        return f"placeholder text '{hit}' in body"
+    return None
+
+
+def _blog_stream_check(partial: str, new_from: int, elapsed: float) -> Optional[str]:
+    """
+    stream_check callback for blog generation: placeholder detection plus an early
+    abort when output has stalled. The rate covers the whole response so far, so it
+    doesn't depend on which key the body is under or how long the post will be.
+    """
+    reason = _body_placeholder_check(partial, new_from)
+    if reason or elapsed < _SLOW_STREAM_SECONDS:
+        return reason
+    rate = _estimate_tokens(partial) / elapsed
+    if rate < _SLOW_STREAM_MIN_TOKENS_PER_SECOND:
+        return f"{_SLOW_STREAM_REASON}: {rate:.1f} tokens/s after {int(elapsed)}s (need {_SLOW_STREAM_MIN_TOKENS_PER_SECOND})"
+    return None
+
+
+# Character limit per social platform
+_SOCIAL_PLATFORM_LIMITS = {
+    'gbp': 1500,
+    'facebook': 500,
+    'instagram': 2200,
+    'linkedin': 700,
+    'twitter': 280
+}
+
+
+# Social post prompt skeleton, rendered with %-style named slots by _build_social_request
+_SOCIAL_PROMPT_TEMPLATE = """Write a %(platform)s post for a %(industry)s business called "%(business_name)s" in %(geo)s.
+
+Topic: %(topic)s
+Tone: %(tone)s
+Character limit: %(char_limit)s
+%(link_line)s
+
+Requirements:
+- Engaging opening hook
+- Value proposition clear
+- Strong CTA
+%(hashtag_line)s
+
+Return as JSON:
+{
+    "text": "The complete post text with engaging copy. This must contain actual content, not be empty.",
+    "hashtags": ["keyword1", "keyword2"],
+    "cta": "call to action text",
+    "image_alt": "suggested image alt text"
+}
+
+CRITICAL RULES:
+1. Return ONLY valid JSON, no markdown, no explanation
+2. "text" MUST contain the actual post copy - never leave it empty
+3. "hashtags" must be words WITHOUT the # symbol (we add it later)
+
+%(example)s"""
+
+# Worked example appended to the social prompt, chosen by industry so a plumber isn't
+# shown HVAC copy. Industries without their own example get the generic one.
+_SOCIAL_EXAMPLES = {
+    'hvac': """Example for HVAC business:
+{
+    "text": "Is your AC struggling to keep up with Florida heat? Here are 3 signs it's time for a tune-up! 🌡️ Don't wait until it breaks down.",
+    "hashtags": ["HVAC", "ACRepair", "FloridaHeat", "CoolingTips"],
+    "cta": "Schedule your tune-up today!",
+    "image_alt": "Air conditioning unit being serviced"
+}""",
+    'plumbing': """Example for plumbing business:
+{
+    "text": "That slow drain won't fix itself! 🚿 Small clogs turn into big backups - here's how to spot trouble before it floods your floor.",
+    "hashtags": ["Plumbing", "DrainCleaning", "Plumber", "HomeTips"],
+    "cta": "Book a drain inspection today!",
+    "image_alt": "Plumber clearing a kitchen sink drain"
+}""",
+    'roofing': """Example for roofing business:
+{
+    "text": "Storm season is coming. ⛈️ Missing shingles and soft spots are easy to miss from the ground - a free inspection now can save a costly leak later.",
+    "hashtags": ["Roofing", "RoofRepair", "StormPrep", "Roofer"],
+    "cta": "Schedule your free roof inspection!",
+    "image_alt": "Roofer inspecting shingles on a house"
+}""",
+    'dental': """Example for dental practice:
+{
+    "text": "Did you know a cleaning every 6 months helps catch small problems before they become painful ones? 😁 Your smile will thank you.",
+    "hashtags": ["Dentist", "DentalCare", "HealthySmile", "OralHealth"],
+    "cta": "Book your cleaning today!",
+    "image_alt": "Smiling patient in a dental chair"
+}""",
+}
+_SOCIAL_EXAMPLE_DEFAULT = """Example for a local service business:
+{
+    "text": "Small problems become big ones when they're ignored. 🛠️ Here are 3 signs it's time to call a pro - and why acting early saves money.",
+    "hashtags": ["LocalBusiness", "ShopLocal", "HomeTips", "ServicePros"],
+    "cta": "Call us today for a free quote!",
+    "image_alt": "Technician greeting a homeowner at the door"
+}"""
+
+
+@lru_cache(maxsize=128)
+def _social_example(industry: str) -> str:
+    """The worked social post example for an industry"""
+    industry_lower = (industry or '').lower()
+    for key, example in _SOCIAL_EXAMPLES.items():
+        if key in industry_lower:
+            return example
+    return _SOCIAL_EXAMPLE_DEFAULT
+
+
+@lru_cache(maxsize=256)
+def _fallback_hashtags(industry: str, geo: str, business_name: str) -> tuple:
+    """Hashtags (without #) from the industry, city and business name, for unparseable social posts"""
+    city = geo.split(',')[0] if geo else ''
+    tags = (''.join(value.split()) for value in (industry or '', city, business_name or ''))
+    return tuple(tag for tag in tags if tag)
+
+
+def _load_social_json(content: str):
+    """Parse the JSON object in a social response, skipping markdown fences and chatter"""
+    # Slice from the first { to the last } in one pass instead of splitting on fences
+    start = content.find('{')
+    end = content.rfind('}')
+    if start == -1 or end < start:
+        return _json_loads(content)
+    content = content[start:end + 1]
+    try:
+        return _json_loads(content)
+    except json.JSONDecodeError:
+        # Trailing text containing a } — decode just the first complete object
+        return _JSON_DECODER.raw_decode(content)[0]
+
+
+# Keep-alive pool for blog page scraping. Module-level so the AIService() instances
+# created per job share one pool instead of each leaving its own open.
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0))
+_HTTP_SESSION.mount('http://', HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0))
+
 
 class AIService:
     """AI content generation service"""
     
     def __init__(self):
-        self._last_call_time = 0
-        self._min_call_interval = 2  # seconds between calls to avoid rate limits
+        self._client = None
+        self._client_key = None
     
     @property
     def anthropic_key(self):
@@ -30,14 +992,12 @@ class AIService:
         """Get default AI model at runtime - Claude Sonnet as primary"""
         return os.environ.get('DEFAULT_AI_MODEL', 'claude-sonnet-4-6')
     
-    def _rate_limit_delay(self):
-        """Enforce minimum delay between API calls"""
-        elapsed = time.time() - self._last_call_time
-        if elapsed < self._min_call_interval:
-            sleep_time = self._min_call_interval - elapsed
-            logger.debug(f"Rate limit delay: sleeping {sleep_time:.1f}s")
-            time.sleep(sleep_time)
-        self._last_call_time = time.time()
+    def _rate_limit_delay(self, model: str, system_prompt: str, prompt: str) -> float:
+        """Seconds to wait before sending this request under the per-model rate limits"""
+        wait = _rate_limit_wait(model, _estimate_tokens(system_prompt) + _estimate_tokens(prompt))
+        if wait:
+            logger.debug(f"Rate limit delay: waiting {wait:.1f}s")
+        return wait
     
     def generate_blog_post(
         self,
@@ -55,11 +1015,15 @@ class AIService:
         phone: str = None,
         email: str = None,
         related_posts: List[Dict] = None,
-        client_id: str = None
+        client_id: str = None,
+        cache: bool = False
     ) -> Dict[str, Any]:
         """
         Generate 100% SEO-optimized blog post with internal linking
         
+        Set cache=True for bulk reruns and template testing: an identical prompt
+        within the response cache TTL reuses the earlier Claude response.
+        
         Returns:
             {
                 'title': str,
@@ -80,11 +1044,163 @@ class AIService:
             }
         """
         internal_links = internal_links or []
-        usps = usps or []
-        related_posts = related_posts or []
         
         logger.info(f"Generating blog: '{keyword}' for {geo}")
         
+        request = self._prepare_blog_request(
+            keyword=keyword,
+            geo=geo,
+            industry=industry,
+            word_count=word_count,
+            tone=tone,
+            business_name=business_name,
+            include_faq=include_faq,
+            faq_count=faq_count,
+            internal_links=internal_links,
+            usps=usps,
+            contact_name=contact_name,
+            phone=phone,
+            email=email,
+            related_posts=related_posts,
+            client_id=client_id
+        )
+        
+        # Generate with Claude
+        logger.info(f"Generating blog with Claude model: {request['model']}")
+        response = self._call_with_retry(
+            request['prompt'],
+            max_tokens=request['max_tokens'],
+            system_prompt=request['system_prompt'],
+            model=request['model'],
+            temperature=0.7,
+            stream_check=_blog_stream_check,
+            cache=cache
+        )
+
+        logger.info(f"Blog generation completed with model={request['model']}")
+        
+        result = self._finish_blog_post(response, keyword, geo, industry, word_count, business_name, internal_links)
+        if cache and result.get('error'):
+            # Don't replay a response that failed validation
+            _response_cache_discard(_response_cache_key(
+                request['model'], 0.7, request['max_tokens'], request['system_prompt'], request['prompt']
+            ))
+        return result
+    
+    async def agenerate_blog_post(
+        self,
+        keyword: str,
+        geo: str,
+        industry: str,
+        word_count: int = 1500,
+        tone: str = 'professional',
+        business_name: str = '',
+        include_faq: bool = True,
+        faq_count: int = 5,
+        internal_links: List[Dict] = None,
+        usps: List[str] = None,
+        contact_name: str = None,
+        phone: str = None,
+        email: str = None,
+        related_posts: List[Dict] = None,
+        client_id: str = None,
+        client=None
+    ) -> Dict[str, Any]:
+        """
+        Async version of generate_blog_post. Streams like the sync path, so bad or
+        stalled output is aborted early by the same _blog_stream_check.
+        
+        Parsing and post-processing run in a worker thread, so when several blogs
+        are in flight one blog's post-processing overlaps the others' Claude calls.
+        Pass an AsyncAnthropic client to share one connection pool across posts.
+        """
+        internal_links = internal_links or []
+        
+        logger.info(f"Generating blog (async): '{keyword}' for {geo}")
+        
+        request = self._prepare_blog_request(
+            keyword=keyword,
+            geo=geo,
+            industry=industry,
+            word_count=word_count,
+            tone=tone,
+            business_name=business_name,
+            include_faq=include_faq,
+            faq_count=faq_count,
+            internal_links=internal_links,
+            usps=usps,
+            contact_name=contact_name,
+            phone=phone,
+            email=email,
+            related_posts=related_posts,
+            client_id=client_id
+        )
+        call_kwargs = {
+            'max_tokens': request['max_tokens'],
+            'system_prompt': request['system_prompt'],
+            'model': request['model'],
+            'temperature': 0.7,
+            'stream_check': _blog_stream_check,
+        }
+        
+        if client is None:
+            async with self._async_client() as client:
+                response = await self._acall_with_retry(client, request['prompt'], **call_kwargs)
+        else:
+            response = await self._acall_with_retry(client, request['prompt'], **call_kwargs)
+        
+        return await asyncio.to_thread(
+            self._finish_blog_post, response, keyword, geo, industry, word_count, business_name, internal_links
+        )
+    
+    def generate_blog_posts(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Generate several blog posts, concurrently when possible.
+        
+        Args:
+            jobs: list of generate_blog_post keyword arguments
+            
+        Returns:
+            List of blog results, in the same order as jobs
+        
+        Raises:
+            RuntimeError: when called from a running event loop — use agenerate_blog_posts
+        """
+        _require_no_running_loop('agenerate_blog_posts')
+        return asyncio.run(self.agenerate_blog_posts(jobs))
+    
+    async def agenerate_blog_posts(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Generate several blog posts concurrently over one connection pool"""
+        logger.info(f"Generating {len(jobs)} blog posts (concurrent)")
+        
+        async with self._async_client() as client:
+            return await _gather_limited([
+                self.agenerate_blog_post(**job, client=client)
+                for job in jobs
+            ])
+    
+    def _prepare_blog_request(
+        self,
+        keyword: str,
+        geo: str,
+        industry: str,
+        word_count: int,
+        tone: str,
+        business_name: str,
+        include_faq: bool,
+        faq_count: int,
+        internal_links: List[Dict],
+        usps: List[str],
+        contact_name: str,
+        phone: str,
+        email: str,
+        related_posts: List[Dict],
+        client_id: str
+    ) -> Dict[str, Any]:
+        """Build the prompt, system prompt, model and token budget for a blog post"""
+        usps = usps or []
+        related_posts = related_posts or []
+        
         # If client_id provided and no related_posts, try to fetch them
         if client_id and not related_posts:
             try:
@@ -95,14 +1211,12 @@ class AIService:
                         logger.info(f"  Link {i+1}: {rp.get('title', '')[:40]} -> {rp.get('url', '')[:50]}")
             except Exception as e:
                 logger.warning(f"Could not fetch related posts: {e}")
-                import traceback
                 logger.debug(traceback.format_exc())
         
         # Try to get agent config for system prompt and settings
         agent_config = None
         try:
-            from app.services.agent_service import agent_service
-            agent_config = agent_service.get_agent('content_writer')
+            agent_config = _get_agent('content_writer')
         except Exception as e:
             logger.debug(f"Could not load content_writer agent: {e}")
         
@@ -124,9 +1238,6 @@ class AIService:
             related_posts=related_posts
         )
         
-        # Enforce rate limiting
-        self._rate_limit_delay()
-        
         # Model selection — Claude only
         claude_model = os.environ.get('BLOG_AI_MODEL', 'claude-sonnet-4-6')
 
@@ -136,49 +1247,30 @@ class AIService:
 
         logger.info(f"Blog generation: word_count={word_count}, tokens={tokens_needed}, model={claude_model}")
 
-        # System prompt - SEO content engine
-        system_prompt = '''You are an SEO content engine generating high-conversion local service blog posts.
-
-CRITICAL LOCATION RULES (MUST FOLLOW):
-1. The PRIMARY KEYWORD may already contain a city or service area.
-2. If the city name appears in the primary keyword, DO NOT repeat the city again in:
-   - Headings
-   - Titles
-   - Introductions
-   - H1/H2/H3
-3. The city + state may appear ONCE for clarity only if it improves readability.
-4. NEVER output patterns like:
-   "Service City in City, State"
-   "Keyword City for City Residents"
-
-HEADLINE RULES:
-- Convert ALL headlines to Proper Case (Title Case).
-- Never leave headlines in lowercase.
-- H1 must be human-readable, not keyword-stuffed.
-
-OUTPUT FORMAT:
-- Output ONLY valid JSON - no markdown, no code blocks, no explanations
-- Follow the exact JSON structure requested
-
-You are generating content for legitimate local service businesses (HVAC, plumbing, dental, etc.).'''
-
+        system_prompt = _BLOG_SYSTEM_PROMPT
         if agent_config:
-            system_prompt = agent_config.system_prompt
-            system_prompt = system_prompt.replace('{tone}', tone)
-            system_prompt = system_prompt.replace('{industry}', industry)
-
-        # Generate with Claude
-        logger.info(f"Generating blog with Claude model: {claude_model}")
-        response = self._call_with_retry(
-            prompt,
-            max_tokens=tokens_needed,
-            system_prompt=system_prompt,
-            model=claude_model,
-            temperature=0.7
-        )
-
-        logger.info(f"Blog generation completed with model={claude_model}")
-        
+            system_prompt = _render_agent_prompt(agent_config.system_prompt, tone, industry)
+        # Static instructions last, so the whole system block is the cached prefix
+        system_prompt = f"{system_prompt}\n\n{_BLOG_INSTRUCTIONS}"
+        
+        return {
+            'prompt': prompt,
+            'system_prompt': system_prompt,
+            'model': claude_model,
+            'max_tokens': tokens_needed
+        }
+    
+    def _finish_blog_post(
+        self,
+        response: Dict[str, Any],
+        keyword: str,
+        geo: str,
+        industry: str,
+        word_count: int,
+        business_name: str,
+        internal_links: List[Dict]
+    ) -> Dict[str, Any]:
+        """Parse, validate and post-process a blog generation response"""
         if response.get('error'):
             logger.error(f"Blog generation failed: {response['error']}")
             return response
@@ -191,8 +1283,8 @@ You are generating content for legitimate local service businesses (HVAC, plumbi
         else:
             logger.debug(f"Raw response preview: {raw_content[:200]}...")
         
-        # Parse the response
-        result = self._parse_blog_response(raw_content)
+        # Parse the response (cities passed explicitly so concurrent blogs can't mix them up)
+        result = self._parse_blog_response(raw_content, _detect_cities(keyword, geo))
         
         # Log what we got from parsing
         logger.info(f"Parse result keys: {list(result.keys())}")
@@ -214,11 +1306,10 @@ You are generating content for legitimate local service businesses (HVAC, plumbi
         body_content = result.get('body', '')
         
         # ===== WORD COUNT VALIDATION =====
-        # Count actual words in the body content (strip HTML tags)
-        text_only = re.sub(r'<[^>]+>', ' ', body_content)
-        text_only = re.sub(r'\s+', ' ', text_only).strip()
-        actual_word_count = len(text_only.split())
+        # Count actual words in the body content (HTML tags excluded)
+        actual_word_count = _count_words_in_html(body_content)
         result['actual_word_count'] = actual_word_count
+        body_content_validated = body_content
         
         logger.info(f"Blog word count: requested={word_count}, actual={actual_word_count}")
         
@@ -237,32 +1328,19 @@ You are generating content for legitimate local service businesses (HVAC, plumbi
         
         # ===== PLACEHOLDER DETECTION =====
         # Check for placeholder text in body and FAQs
-        placeholder_patterns = [
-            'Question 1 about', 'Question 2 about', 'Question 3 about', 
-            'Question 4 about', 'Question 5 about',
-            'Answer to question 1', 'Answer to question 2', 'Answer to question 3',
-            'Answer to question 4', 'Answer to question 5',
-            'Answer 1', 'Answer 2', 'Answer 3', 'Answer 4', 'Answer 5',
-            'Response...', 'Insight...', 'Explanation...', 'Advice...', 
-            'Information...', 'Clarification...', 'CTA section...', 
-            'Content...', 'Details...', 'Details here', 'Content here',
-            'Full HTML content', 'WRITE', 'DO NOT put placeholder',
-            '[specific', '[factor', '[qualification', '[shorter time]',
-            'MANDATORY:', '[COUNT YOUR WORDS', '[60-80 word',
-            'Write 100+ words', 'Write 80+ words', 'Write 40+ words',
-            '40-60 word answer', 'Real specific question',
-            '<FULL HTML', '<THE FULL HTML'
-        ]
-        
-        has_placeholders = any(p.lower() in body_content.lower() for p in placeholder_patterns)
+        has_placeholders = _find_placeholder(body_content) is not None
         
-        # Check FAQs for placeholders
+        # Check FAQs for placeholders — answers are scanned together in one pass
         faq_items = result.get('faq_items', [])
-        for faq in faq_items:
-            answer = faq.get('answer', '')
-            if len(answer) < 20 or any(p.lower() in answer.lower() for p in placeholder_patterns):
+        answers = [faq.get('answer', '') for faq in faq_items]
+        for answer in answers:
+            if len(answer) < 20:
                 has_placeholders = True
-                logger.warning(f"FAQ has placeholder or too short: {answer[:50]}") 
+                logger.warning(f"FAQ answer too short: {answer[:50]}")
+        faq_placeholder = _find_placeholder('\n'.join(answers)) if answers else None
+        if faq_placeholder:
+            has_placeholders = True
+            logger.warning(f"FAQ has placeholder text: {faq_placeholder}")
         
         if has_placeholders:
             logger.error("Blog contains placeholder text - AI did not generate real content")
@@ -272,15 +1350,9 @@ You are generating content for legitimate local service businesses (HVAC, plumbi
             }
         
         # ===== POST-PROCESSING FOR SEO QUALITY =====
-        actual_word_count = len(body_content.split())
-        
-        logger.info(f"Blog raw word count: {actual_word_count} (target: {word_count})")
-        
         # Post-process: Inject internal links if not already present
-        if internal_links and body_content:
+        if internal_links and body_content and internal_linking_service:
             try:
-                from app.services.internal_linking_service import internal_linking_service
-                
                 # Check how many links already in content
                 existing_links = body_content.count('<a href=')
                 
@@ -315,38 +1387,48 @@ You are generating content for legitimate local service businesses (HVAC, plumbi
             result['meta_description'] = f"Expert {keyword} services in {geo}. {business_name or 'We'} provide professional {industry} solutions. Contact us today!"[:160]
             logger.warning(f"Generated fallback meta_description")
         
-        # Calculate final word count
-        result['word_count'] = len(result.get('body', '').split())
+        # Final word count — recount only if post-processing rewrote the body
+        # (_fix_h2_locations returns the same object when nothing changed)
+        if result['body'] is not body_content_validated:
+            actual_word_count = _count_words_in_html(result['body'])
+        result['word_count'] = actual_word_count
+        
+        # JSON-LD is derived from the FAQs rather than generated by the model
+        result['faq_schema'] = _faq_schema(faq_items)
+        
+        # 'html' is kept for older clients; alias the final body rather than
+        # carrying a second, pre-post-processing copy of the article
+        result['html'] = result['body']
         
         logger.info(f"Blog generated successfully: {result.get('title', 'no title')[:50]} ({result['word_count']} words)")
         return result
     
     def _fix_h2_locations(self, content: str, geo: str, keyword: str) -> str:
         """Ensure H2 headings contain location references"""
-        import re
+        if not geo or '<h2>' not in content:
+            return content
+        geo_lower = geo.lower()
         
         def fix_h2(match):
             h2_content = match.group(1)
+            h2_lower = h2_content.lower()
             # Check if location is already present
-            if geo.lower() in h2_content.lower():
+            if geo_lower in h2_lower:
                 return match.group(0)
             # Add location to H2
             # Common patterns to enhance
-            h2_lower = h2_content.lower()
-            if 'why' in h2_lower or 'how' in h2_lower or 'what' in h2_lower:
+            words = set(_WORD_RE.findall(h2_lower))
+            if words & _H2_QUESTION_WORDS:
                 return f'<h2>{h2_content} in {geo}</h2>'
-            elif 'benefits' in h2_lower or 'advantages' in h2_lower:
+            elif words & _H2_BENEFIT_WORDS:
                 return f'<h2>{h2_content} for {geo} Residents</h2>'
-            elif 'cost' in h2_lower or 'price' in h2_lower:
+            elif words & _H2_COST_WORDS:
                 return f'<h2>{h2_content} in the {geo} Area</h2>'
             else:
                 return f'<h2>{h2_content} in {geo}</h2>'
         
         # Fix H2s that don't have location
-        pattern = r'<h2>([^<]+)</h2>'
-        fixed_content = re.sub(pattern, fix_h2, content)
-        
-        return fixed_content
+        return _H2_RE.sub(fix_h2, content)
     
     def generate_social_post(
         self,
@@ -358,124 +1440,274 @@ You are generating content for legitimate local service businesses (HVAC, plumbi
         tone: str = 'friendly',
         include_hashtags: bool = True,
         hashtag_count: int = 5,
-        link_url: str = ''
+        link_url: str = '',
+        cache: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Generate social media post for specific platform using social_writer agent
+        
+        cache: reuse an identical earlier response (see _call_with_retry)
+        """
+        
+        logger.info(f"Generating {platform} post: '{topic}'")
+        
+        request = self._build_social_request(
+            topic, platform, business_name, industry, geo,
+            tone, include_hashtags, hashtag_count, link_url
+        )
+
+        response = self._call_with_retry(request['prompt'], cache=cache, **request['call_kwargs'])
+        
+        return self._parse_social_response(
+            response, topic, business_name, industry, geo,
+            request['char_limit'], hashtag_count
+        )
+    
+    async def agenerate_social_post(
+        self,
+        topic: str,
+        platform: str,
+        business_name: str,
+        industry: str,
+        geo: str,
+        tone: str = 'friendly',
+        include_hashtags: bool = True,
+        hashtag_count: int = 5,
+        link_url: str = '',
+        client=None
+    ) -> Dict[str, Any]:
+        """
+        Async version of generate_social_post.
+        
+        Pass an AsyncAnthropic client to share one connection pool across
+        concurrent posts; otherwise a client is created for this call.
+        """
+        logger.info(f"Generating {platform} post (async): '{topic}'")
+        
+        request = self._build_social_request(
+            topic, platform, business_name, industry, geo,
+            tone, include_hashtags, hashtag_count, link_url
+        )
+        
+        if client is None:
+            async with self._async_client() as client:
+                response = await self._acall_with_retry(client, request['prompt'], **request['call_kwargs'])
+        else:
+            response = await self._acall_with_retry(client, request['prompt'], **request['call_kwargs'])
+        
+        return self._parse_social_response(
+            response, topic, business_name, industry, geo,
+            request['char_limit'], hashtag_count
+        )
+    
+    def _build_social_request(
+        self,
+        topic: str,
+        platform: str,
+        business_name: str,
+        industry: str,
+        geo: str,
+        tone: str,
+        include_hashtags: bool,
+        hashtag_count: int,
+        link_url: str
+    ) -> Dict[str, Any]:
+        """Build the prompt and Claude call settings for a social post"""
+        char_limit = _SOCIAL_PLATFORM_LIMITS.get(platform, 500)
+        
+        # Try to get agent config
+        agent_config = None
+        try:
+            agent_config = _get_agent('social_writer')
+        except Exception as e:
+            logger.debug(f"Could not load social_writer agent: {e}")
+        
+        prompt = _SOCIAL_PROMPT_TEMPLATE % {
+            'platform': platform.upper(),
+            'industry': industry,
+            'business_name': business_name,
+            'geo': geo,
+            'topic': topic,
+            'tone': tone,
+            'char_limit': char_limit,
+            'link_line': 'Include a call-to-action with link: ' + link_url if link_url else '',
+            'hashtag_line': f'- Include {hashtag_count} relevant hashtags' if include_hashtags else '',
+            'example': _social_example(industry),
+        }
+
+        # Use agent config if available, but override for speed
+        if agent_config:
+            fast_model = self.default_model  # claude-sonnet-4
+            fast_tokens = min(agent_config.max_tokens, 500)  # Cap at 500 for social
+            call_kwargs = {
+                'max_tokens': fast_tokens,
+                'system_prompt': agent_config.system_prompt,
+                'model': fast_model,
+                'temperature': agent_config.temperature
+            }
+            logger.info(f"Using social_writer agent config (model={fast_model})")
+        else:
+            call_kwargs = {'max_tokens': 500}
+        
+        return {'prompt': prompt, 'call_kwargs': call_kwargs, 'char_limit': char_limit}
+    
+    def _parse_social_response(
+        self,
+        response: Dict[str, Any],
+        topic: str,
+        business_name: str,
+        industry: str,
+        geo: str,
+        char_limit: int,
+        hashtag_count: int
+    ) -> Dict[str, Any]:
+        """Turn a Claude response into a social post dict, with a raw-text fallback"""
+        if response.get('error'):
+            logger.error(f"Social generation failed: {response['error']}")
+            return response
+        
+        try:
+            result = _load_social_json(response.get('content', '{}'))
+            
+            # Strip # from hashtags if AI included them
+            if 'hashtags' in result and isinstance(result['hashtags'], list):
+                result['hashtags'] = [h.lstrip('#') for h in result['hashtags']]
+            
+            logger.info(f"Social post generated: {len(result.get('text', ''))} chars")
+            return result
+            
+        except json.JSONDecodeError as e:
+            logger.warning(f"Social JSON parse failed: {e}, using raw content")
+            # Generate a usable fallback - DON'T add # prefix since render adds it
+            raw_text = response.get('content', topic)
+            return {
+                'text': raw_text[:char_limit] if len(raw_text) > char_limit else raw_text,
+                'hashtags': list(_fallback_hashtags(industry, geo, business_name)[:hashtag_count]),
+                'cta': f"Contact {business_name} today!",
+                'image_alt': f"{topic} - {business_name}"
+            }
+    
+    def generate_social_kit_batched(
+        self,
+        topic: str,
+        business_name: str,
+        industry: str,
+        geo: str,
+        tone: str = 'friendly',
+        link_url: str = '',
+        platforms: List[str] = None,
+        hashtag_count: int = 5
+    ) -> Dict[str, Dict]:
+        """
+        Generate posts for several platforms in a single Claude call.
+        
+        The platforms share the topic and business context, so one request saves
+        the repeated input tokens and rate-limit slots of one call per platform.
+        
+        Returns:
+            {platform: post dict} for every platform the response covered. On an
+            API error every platform maps to the error response.
+        """
+        platforms = platforms or ['gbp', 'facebook', 'instagram', 'linkedin']
+        
+        logger.info(f"Generating social kit for {len(platforms)} platforms (one call)")
+        
+        request = self._build_social_kit_request(
+            topic, platforms, business_name, industry, geo, tone, hashtag_count, link_url
+        )
+        response = self._call_with_retry(request['prompt'], **request['call_kwargs'])
+        
+        if response.get('error'):
+            logger.error(f"Social kit generation failed: {response['error']}")
+            return {platform: response for platform in platforms}
+        
+        try:
+            data = _load_social_json(response.get('content', '{}'))
+        except json.JSONDecodeError as e:
+            logger.warning(f"Social kit JSON parse failed: {e}")
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        
+        kit = {}
+        for platform in platforms:
+            post = data.get(platform)
+            if not isinstance(post, dict) or not post.get('text'):
+                continue
+            # Strip # from hashtags if AI included them
+            if isinstance(post.get('hashtags'), list):
+                post['hashtags'] = [h.lstrip('#') for h in post['hashtags']]
+            kit[platform] = post
+        
+        logger.info(f"Social kit generated {len(kit)}/{len(platforms)} platforms in one call")
+        return kit
+    
+    def _build_social_kit_request(
+        self,
+        topic: str,
+        platforms: List[str],
+        business_name: str,
+        industry: str,
+        geo: str,
+        tone: str,
+        hashtag_count: int,
+        link_url: str
     ) -> Dict[str, Any]:
-        """Generate social media post for specific platform using social_writer agent"""
-        
-        logger.info(f"Generating {platform} post: '{topic}'")
-        
-        platform_limits = {
-            'gbp': 1500,
-            'facebook': 500,
-            'instagram': 2200,
-            'linkedin': 700,
-            'twitter': 280
-        }
-        
-        char_limit = platform_limits.get(platform, 500)
-        
-        # Try to get agent config
+        """Build the prompt and Claude call settings for a multi-platform social kit"""
         agent_config = None
         try:
-            from app.services.agent_service import agent_service
-            agent_config = agent_service.get_agent('social_writer')
+            agent_config = _get_agent('social_writer')
         except Exception as e:
             logger.debug(f"Could not load social_writer agent: {e}")
         
-        # Build user prompt
-        prompt = f"""Write a {platform.upper()} post for a {industry} business called "{business_name}" in {geo}.
+        platform_lines = '\n'.join(
+            f"- {platform}: {_SOCIAL_PLATFORM_LIMITS.get(platform, 500)} characters max"
+            for platform in platforms
+        )
+        post_schema = ',\n'.join(
+            f'    "{platform}": {{"text": "...", "hashtags": ["keyword1", "keyword2"], "cta": "...", "image_alt": "..."}}'
+            for platform in platforms
+        )
+        
+        prompt = f"""Write one social media post per platform for a {industry} business called "{business_name}" in {geo}.
 
 Topic: {topic}
 Tone: {tone}
-Character limit: {char_limit}
 {"Include a call-to-action with link: " + link_url if link_url else ""}
 
-Requirements:
+Platforms and character limits:
+{platform_lines}
+
+Requirements for every post:
 - Engaging opening hook
 - Value proposition clear
 - Strong CTA
-{"- Include " + str(hashtag_count) + " relevant hashtags" if include_hashtags else ""}
+- Include {hashtag_count} relevant hashtags
+- Write each post for its platform's audience and length - don't reuse the same copy
 
-Return as JSON:
+Return as JSON with one key per platform:
 {{
-    "text": "The complete post text with engaging copy. This must contain actual content, not be empty.",
-    "hashtags": ["keyword1", "keyword2"],
-    "cta": "call to action text",
-    "image_alt": "suggested image alt text"
+{post_schema}
 }}
 
 CRITICAL RULES:
 1. Return ONLY valid JSON, no markdown, no explanation
-2. "text" MUST contain the actual post copy - never leave it empty
-3. "hashtags" must be words WITHOUT the # symbol (we add it later)
-
-Example for HVAC business:
-{{
-    "text": "Is your AC struggling to keep up with Florida heat? Here are 3 signs it's time for a tune-up! 🌡️ Don't wait until it breaks down.",
-    "hashtags": ["HVAC", "ACRepair", "FloridaHeat", "CoolingTips"],
-    "cta": "Schedule your tune-up today!",
-    "image_alt": "Air conditioning unit being serviced"
-}}"""
-
-        # Enforce rate limiting
-        self._rate_limit_delay()
+2. Every "text" MUST contain the actual post copy - never leave it empty
+3. "hashtags" must be words WITHOUT the # symbol (we add it later)"""
         
-        # Use agent config if available, but override for speed
+        # Same per-post budget as a single social post
+        max_tokens = 500 * len(platforms)
         if agent_config:
-            fast_model = self.default_model  # claude-sonnet-4
-            fast_tokens = min(agent_config.max_tokens, 500)  # Cap at 500 for social
-            
-            response = self._call_with_retry(
-                prompt, 
-                max_tokens=fast_tokens,
-                system_prompt=agent_config.system_prompt,
-                model=fast_model,
-                temperature=agent_config.temperature
-            )
-            logger.info(f"Used social_writer agent config (model={fast_model})")
+            call_kwargs = {
+                'max_tokens': max_tokens,
+                'system_prompt': agent_config.system_prompt,
+                'model': self.default_model,
+                'temperature': agent_config.temperature
+            }
         else:
-            response = self._call_with_retry(prompt, max_tokens=500)
+            call_kwargs = {'max_tokens': max_tokens}
         
-        if response.get('error'):
-            logger.error(f"Social generation failed: {response['error']}")
-            return response
-        
-        try:
-            content = response.get('content', '{}')
-            # Clean markdown code blocks if present
-            if '```' in content:
-                content = content.split('```')[1]
-                if content.startswith('json'):
-                    content = content[4:]
-            
-            # Try to find JSON object
-            content = content.strip()
-            if not content.startswith('{'):
-                # Try to extract JSON from response
-                start = content.find('{')
-                end = content.rfind('}')
-                if start != -1 and end != -1:
-                    content = content[start:end+1]
-            
-            result = json.loads(content)
-            
-            # Strip # from hashtags if AI included them
-            if 'hashtags' in result and isinstance(result['hashtags'], list):
-                result['hashtags'] = [h.lstrip('#') for h in result['hashtags']]
-            
-            logger.info(f"Social post generated: {len(result.get('text', ''))} chars")
-            return result
-            
-        except json.JSONDecodeError as e:
-            logger.warning(f"Social JSON parse failed: {e}, using raw content")
-            # Generate a usable fallback - DON'T add # prefix since render adds it
-            raw_text = response.get('content', topic)
-            return {
-                'text': raw_text[:char_limit] if len(raw_text) > char_limit else raw_text,
-                'hashtags': [industry.replace(' ', ''), geo.split(',')[0].replace(' ', ''), business_name.replace(' ', '')][:hashtag_count],
-                'cta': f"Contact {business_name} today!",
-                'image_alt': f"{topic} - {business_name}"
-            }
+        return {'prompt': prompt, 'call_kwargs': call_kwargs}
     
     def generate_social_kit(
         self,
@@ -490,10 +1722,43 @@ Example for HVAC business:
         """Generate posts for multiple platforms at once"""
         platforms = platforms or ['gbp', 'facebook', 'instagram', 'linkedin']
         
-        logger.info(f"Generating social kit for {len(platforms)} platforms")
-        
         kit = {}
-        for platform in platforms:
+        remaining = platforms
+        if len(platforms) >= 2:
+            kit = self.generate_social_kit_batched(
+                topic=topic,
+                business_name=business_name,
+                industry=industry,
+                geo=geo,
+                tone=tone,
+                link_url=link_url,
+                platforms=platforms
+            )
+            remaining = [platform for platform in platforms if platform not in kit]
+            if not remaining:
+                return kit
+            logger.warning(f"Social kit response missing {remaining}, generating them individually")
+        
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop in this thread (normal for Flask/gunicorn sync workers) —
+            # run the remaining platforms concurrently
+            kit.update(asyncio.run(self.agenerate_social_kit(
+                topic=topic,
+                business_name=business_name,
+                industry=industry,
+                geo=geo,
+                tone=tone,
+                link_url=link_url,
+                platforms=remaining
+            )))
+            return {platform: kit[platform] for platform in platforms}
+        
+        # Called from inside a running loop — asyncio.run() isn't allowed, go one at a time
+        logger.info(f"Generating social kit for {len(remaining)} platforms")
+        
+        for platform in remaining:
             result = self.generate_social_post(
                 topic=topic,
                 platform=platform,
@@ -510,7 +1775,39 @@ Example for HVAC business:
                 logger.warning("Rate limit hit, stopping social kit generation")
                 break
         
-        return kit
+        return {platform: kit[platform] for platform in platforms if platform in kit}
+    
+    async def agenerate_social_kit(
+        self,
+        topic: str,
+        business_name: str,
+        industry: str,
+        geo: str,
+        tone: str = 'friendly',
+        link_url: str = '',
+        platforms: List[str] = None
+    ) -> Dict[str, Dict]:
+        """Generate posts for multiple platforms concurrently over one connection pool"""
+        platforms = platforms or ['gbp', 'facebook', 'instagram', 'linkedin']
+        
+        logger.info(f"Generating social kit for {len(platforms)} platforms (concurrent)")
+        
+        async with self._async_client() as client:
+            results = await _gather_limited([
+                self.agenerate_social_post(
+                    topic=topic,
+                    platform=platform,
+                    business_name=business_name,
+                    industry=industry,
+                    geo=geo,
+                    tone=tone,
+                    link_url=link_url,
+                    client=client
+                )
+                for platform in platforms
+            ])
+        
+        return dict(zip(platforms, results))
     
     def _build_blog_prompt(
         self,
@@ -531,46 +1828,10 @@ Example for HVAC business:
     ) -> str:
         """Build the blog generation prompt - Clean SEO-focused version"""
         
-        # Helper function to convert to Title Case properly
-        def to_title_case(text):
-            if not text:
-                return text
-            lowercase_words = {'a', 'an', 'the', 'and', 'but', 'or', 'for', 'nor', 
-                             'on', 'at', 'to', 'by', 'in', 'of', 'with', 'as'}
-            words = text.split()
-            result = []
-            for i, word in enumerate(words):
-                if i == 0 or word.lower() not in lowercase_words:
-                    result.append(word.capitalize())
-                else:
-                    result.append(word.lower())
-            return ' '.join(result)
-        
-        # Known cities to detect in keyword (includes common Florida cities)
-        known_cities = [
-            'sarasota', 'port charlotte', 'fort myers', 'naples', 'tampa', 'orlando',
-            'jacksonville', 'miami', 'bradenton', 'venice', 'punta gorda', 'north port',
-            'cape coral', 'bonita springs', 'estero', 'lehigh acres', 'englewood',
-            'arcadia', 'nokomis', 'osprey', 'lakewood ranch', 'palmetto', 'ellenton',
-            'parrish', 'ruskin', 'sun city center', 'apollo beach', 'brandon', 'riverview'
-        ]
-
-        # Also add the geo city and any service areas from the geo string
-        geo_city_lower = (geo.split(',')[0].strip().lower() if geo else '')
-        if geo_city_lower and geo_city_lower not in known_cities:
-            known_cities.append(geo_city_lower)
-
-        # Check if keyword already contains a city name (check longest first for multi-word cities)
-        keyword_lower = keyword.lower()
-        keyword_city = None
-        for test_city in sorted(known_cities, key=len, reverse=True):
-            if test_city in keyword_lower:
-                keyword_city = test_city.title()
-                break
+        keyword_city, settings_city = _detect_cities(keyword, geo)
         
-        # Parse geo from settings
+        # Parse state from settings
         geo_parts = geo.split(',') if geo else ['', '']
-        settings_city = geo_parts[0].strip() if len(geo_parts) > 0 else ''
         state = geo_parts[1].strip() if len(geo_parts) > 1 else ''
         
         # USE THE CITY FROM KEYWORD if present, otherwise use settings
@@ -578,15 +1839,14 @@ Example for HVAC business:
             city = keyword_city
             logger.info(f"Using city from keyword: '{city}' (ignoring settings city '{settings_city}')")
         else:
-            city = to_title_case(settings_city) if settings_city else ''
+            city = _to_title_case(settings_city) if settings_city else ''
         
-        state = state.upper() if len(state) == 2 else to_title_case(state)
+        state = state.upper() if len(state) == 2 else _to_title_case(state)
         
         # Convert keyword to Title Case
-        primary_keyword = to_title_case(keyword)
+        primary_keyword = _to_title_case(keyword)
         
-        # Build internal links section
-        links_text = ""
+        # Collect internal links, then related posts not already linked
         all_links = []
         
         if internal_links:
@@ -597,31 +1857,18 @@ Example for HVAC business:
                     all_links.append({'url': url, 'title': title})
         
         if related_posts:
+            seen_urls = {link['url'] for link in all_links}
             for post in related_posts[:4]:
                 url = post.get('url', post.get('published_url', ''))
                 title = post.get('title', '')
-                if url and title and not any(l['url'] == url for l in all_links):
+                if url and title and url not in seen_urls:
+                    seen_urls.add(url)
                     all_links.append({'url': url, 'title': title})
         
-        # Build internal links section with explicit HTML format
-        links_text = ""
-        links_html_examples = ""
-        if all_links:
-            links_text = "INTERNAL LINKS TO INSERT (REQUIRED - add at least 3):\n"
-            for i, link in enumerate(all_links[:6]):
-                links_text += f"{i+1}. {link['title']}: {link['url']}\n"
-                if i < 3:
-                    links_html_examples += f'<a href="{link["url"]}">{link["title"]}</a>, '
-            links_html_examples = links_html_examples.rstrip(', ')
-        
-        # Build contact info
-        contact_info = f"Company Name: {business_name}\n"
-        if contact_name:
-            contact_info += f"Contact Name: {contact_name}\n"
-        if phone:
-            contact_info += f"Phone: {phone}\n"
-        if email:
-            contact_info += f"Email: {email}\n"
+        links_text, links_html_examples = _blog_links_sections(all_links)
+        
+        # Company, phone and email have their own lines in the blog details
+        contact_info = f"CONTACT NAME: {contact_name}\n" if contact_name else ''
         
         logger.info(f"Building prompt: keyword='{primary_keyword}', city='{city}', state='{state}', keyword_city='{keyword_city}', settings_city='{settings_city}', links={len(all_links)}")
         
@@ -629,80 +1876,33 @@ Example for HVAC business:
         self._last_settings_city = settings_city
         self._last_keyword_city = keyword_city
 
-        return f"""You are writing a {word_count}-word blog post for a local service business.
-
-TARGET: {word_count} words minimum (this is CRITICAL - count your words!)
-
-TOPIC: {primary_keyword}
-COMPANY: {business_name}
-CITY: {city}, {state}
-{contact_info}
-
-{links_text}
-
-REQUIRED ARTICLE STRUCTURE:
-Write each section with the specified word count.
-CRITICAL: At least 3 of your H2 headings MUST contain the keyword "{primary_keyword}" (or its core words) naturally.
-Example good headings: "Benefits of {primary_keyword}", "How {primary_keyword} Works", "Cost of {primary_keyword} in {city}"
-Example bad headings: "Benefits", "Our Process", "Pricing" (these are too generic and hurt SEO score)
-
-<h2>Your Guide to {primary_keyword} in {city}</h2> (250 words)
-Write 250 words introducing {primary_keyword} services in {city}. Use the keyword "{primary_keyword}" naturally within the first 2 sentences.
-
-<h2>Top Benefits of {primary_keyword}</h2> (300 words)
-Write 300 words covering 3 key benefits, each as an H3 subheading:
-- <h3>Benefit 1 related to {primary_keyword}</h3> - 100 words
-- <h3>Benefit 2 related to {primary_keyword}</h3> - 100 words
-- <h3>Benefit 3 related to {primary_keyword}</h3> - 100 words
-
-<h2>How {business_name} Handles {primary_keyword}</h2> (200 words)
-Write 200 words explaining the process. Include internal links here.
-
-<h2>{primary_keyword} Cost and Pricing Factors</h2> (200 words)
-Write 200 words about what affects pricing for {primary_keyword} in {city}.
-
-<h2>Why Choose {business_name} for {primary_keyword}</h2> (200 words)
-Write 200 words about why {business_name} is the best choice. Include contact information and internal links.
-
-<h2>Frequently Asked Questions About {primary_keyword}</h2> (200 words)
-Write 5 Q&A pairs about {primary_keyword}.
-
-<h2>Get Started with {primary_keyword} Today</h2> (150 words)
-Write 150 words with a strong call-to-action. Include phone and email.
-
-TOTAL: {word_count}+ words
-
-**CRITICAL SEO REQUIREMENTS (each one affects the score):**
-1. WORD COUNT: {word_count}+ words minimum
-2. KEYWORD IN HEADINGS: At least 3 of your H2/H3 headings must contain "{primary_keyword}" or its core words
-3. KEYWORD IN FIRST 100 WORDS: Use "{primary_keyword}" in the very first paragraph
-4. KEYWORD DENSITY: Use "{primary_keyword}" naturally 8-15 times throughout the article (target 1-2% density)
-5. INTERNAL LINKS: Insert at least 5 links using <a href="URL">anchor text</a> format. Spread them across multiple sections.
-   {('Links to use: ' + links_html_examples) if links_html_examples else 'Use links like: <a href="/services">our services</a>, <a href="/contact">contact us</a>'}
-6. META TITLE: 55-60 characters, must contain "{primary_keyword}" — e.g. "{primary_keyword} | {business_name}"
-7. META DESCRIPTION: 150-160 characters, must contain "{primary_keyword}"
-8. HEADINGS: Use at least 5 H2 tags and 3 H3 tags in the body
-9. Location: Use ONLY {city}, {state} - no other cities
-
-Return ONLY valid JSON:
-{{"meta_title": "[55-60 chars, must include {primary_keyword}]",
-"meta_description": "[150-160 chars, must include {primary_keyword.lower()}]",
-"h1": "{primary_keyword} - Trusted {city} Experts | {business_name}",
-"body": "<h2>Your Guide to {primary_keyword} in {city}</h2><p>... include <a href='URL'>links</a> ...</p>...",
-"faq_items": [
-  {{"question": "How much does {primary_keyword.lower()} cost in {city}?", "answer": "Costs vary by project. Contact {business_name} at {phone or 'our office'} for a free estimate."}},
-  {{"question": "How long does {primary_keyword.lower()} take?", "answer": "Most jobs take 1-3 days. {business_name} provides accurate timelines during consultation."}},
-  {{"question": "Is {business_name} licensed and insured?", "answer": "Yes, {business_name} is fully licensed and insured to serve {city}."}},
-  {{"question": "Do you offer emergency service?", "answer": "Yes, contact {business_name} anytime for emergency {primary_keyword.lower()}."}},
-  {{"question": "What areas do you serve?", "answer": "{business_name} proudly serves {city} and surrounding areas in {state}."}}
-],
-"faq_schema": {{"@context": "https://schema.org", "@type": "FAQPage", "mainEntity": []}},
-"cta": {{"company_name": "{business_name}", "phone": "{phone or ''}", "email": "{email or ''}"}}
-}}
-
-REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links, and keyword "{primary_keyword}" in 3+ headings!"""
+        return _render_blog_prompt(
+            word_count=word_count,
+            primary_keyword=primary_keyword,
+            business_name=business_name,
+            city=city,
+            state=state,
+            contact_info=contact_info,
+            links_text=links_text,
+            links_html_examples=links_html_examples,
+            phone=phone or '',
+            email=email or '',
+        )
     
     def _get_related_posts(self, client_id: str, current_keyword: str, limit: int = 6) -> List[Dict]:
+        """Related content for internal linking, served from a short-lived cache"""
+        key = (client_id, current_keyword.lower(), limit)
+        cached = _related_posts_cache_get(key)
+        if cached is not None:
+            return cached
+        
+        related = self._fetch_related_posts(client_id, current_keyword, limit)
+        if related is None:
+            return []
+        _related_posts_cache_put(key, related)
+        return list(related)
+    
+    def _fetch_related_posts(self, client_id: str, current_keyword: str, limit: int = 6) -> Optional[List[Dict]]:
         """
         Fetch related content from the same client for internal linking.
         Sources (in order):
@@ -710,13 +1910,16 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
         2. Published blog posts from database
         3. Service pages from database
         4. Client service_pages JSON field
-        Returns list of {title, url, keyword} for internal linking.
+        Returns list of {title, url, keyword} for internal linking, or None on error.
         """
         related = []
+        seen_urls = set()
+        keyword_lower = current_keyword.lower()
+        
+        if DBClient is None:
+            return []
         
         try:
-            from app.models.db_models import DBBlogPost, DBClient, DBServicePage
-            
             # Get client for website URL
             client = DBClient.query.get(client_id)
             base_url = ''
@@ -735,9 +1938,10 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
                     scraped_links = self._scrape_blog_urls(blog_url, base_url, limit)
                     for link in scraped_links:
                         # Skip if matches current keyword
-                        if current_keyword.lower() in link.get('title', '').lower():
+                        if keyword_lower in link.get('title', '').lower():
                             continue
-                        if not any(r['url'] == link['url'] for r in related):
+                        if link['url'] not in seen_urls:
+                            seen_urls.add(link['url'])
                             related.append(link)
                         if len(related) >= limit:
                             break
@@ -746,24 +1950,28 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
                     logger.warning(f"Could not scrape blog URLs: {e}")
             
             # 2. Get published blog posts from database
+            # The current-keyword exclusion runs in SQL, so at most `limit` rows are
+            # needed (each scraped link can shadow at most one of them as a duplicate)
             if len(related) < limit:
                 posts = DBBlogPost.query.filter(
                     DBBlogPost.client_id == client_id,
                     DBBlogPost.status == 'published',
-                    DBBlogPost.published_url.isnot(None)
-                ).order_by(DBBlogPost.published_at.desc()).limit(limit + 5).all()
+                    DBBlogPost.published_url.isnot(None),
+                    or_(DBBlogPost.primary_keyword.is_(None),
+                        func.lower(DBBlogPost.primary_keyword) != keyword_lower)
+                ).order_by(DBBlogPost.published_at.desc()).limit(limit).with_entities(
+                    DBBlogPost.title, DBBlogPost.published_url, DBBlogPost.primary_keyword
+                ).all()
                 
                 for post in posts:
-                    if post.primary_keyword and post.primary_keyword.lower() == current_keyword.lower():
-                        continue
-                    
                     if post.published_url:
                         url = post.published_url
                         # Make URL absolute if it's relative
                         if not url.startswith('http') and base_url:
                             url = f"{base_url}{url}" if url.startswith('/') else f"{base_url}/{url}"
                         
-                        if not any(r['url'] == url for r in related):
+                        if url not in seen_urls:
+                            seen_urls.add(url)
                             related.append({
                                 'title': post.title,
                                 'url': url,
@@ -778,18 +1986,20 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
                 service_pages = DBServicePage.query.filter(
                     DBServicePage.client_id == client_id,
                     DBServicePage.status == 'published',
-                    DBServicePage.published_url.isnot(None)
-                ).limit(limit - len(related) + 3).all()
+                    DBServicePage.published_url.isnot(None),
+                    or_(DBServicePage.primary_keyword.is_(None),
+                        func.lower(DBServicePage.primary_keyword) != keyword_lower)
+                ).limit(limit - len(related)).with_entities(
+                    DBServicePage.title, DBServicePage.published_url, DBServicePage.primary_keyword
+                ).all()
                 
                 for page in service_pages:
-                    if page.primary_keyword and page.primary_keyword.lower() == current_keyword.lower():
-                        continue
-                    
                     if page.published_url:
                         url = page.published_url
                         if not url.startswith('http') and base_url:
                             url = f"{base_url}{url}" if url.startswith('/') else f"{base_url}/{url}"
                         
+                        seen_urls.add(url)
                         related.append({
                             'title': page.title or page.primary_keyword,
                             'url': url,
@@ -804,7 +2014,7 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
                 stored_pages = client.get_service_pages() or []
                 for page in stored_pages:
                     kw = page.get('keyword', page.get('title', ''))
-                    if kw.lower() == current_keyword.lower():
+                    if kw.lower() == keyword_lower:
                         continue
                     
                     url = page.get('url', '')
@@ -813,7 +2023,8 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
                             url = f"{base_url}{url}" if url.startswith('/') else f"{base_url}/{url}"
                         
                         # Avoid duplicates
-                        if not any(r['url'] == url for r in related):
+                        if url not in seen_urls:
+                            seen_urls.add(url)
                             related.append({
                                 'title': page.get('title', kw),
                                 'url': url,
@@ -828,7 +2039,7 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
             
         except Exception as e:
             logger.warning(f"Error fetching related posts: {e}")
-            return []
+            return None
     
     def _scrape_blog_urls(self, blog_url: str, base_url: str, limit: int = 6) -> List[Dict]:
         """
@@ -842,9 +2053,8 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
         Returns:
             List of {title, url, keyword} dictionaries
         """
-        import requests
-        from bs4 import BeautifulSoup
-        from urllib.parse import urljoin, urlparse
+        if BeautifulSoup is None:
+            return []
         
         blog_links = []
         
@@ -853,7 +2063,7 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
             headers = {
                 'User-Agent': 'Mozilla/5.0 (compatible; MCPBot/1.0; +https://karmamarketingandmedia.com)'
             }
-            response = requests.get(blog_url, headers=headers, timeout=10)
+            response = _HTTP_SESSION.get(blog_url, headers=headers, timeout=10)
             response.raise_for_status()
             
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -884,11 +2094,12 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
                     continue
                 
                 # Skip navigation, social, etc.
-                if any(skip in href.lower() for skip in ['#', 'javascript:', 'mailto:', 'tel:', 'facebook', 'twitter', 'instagram', 'linkedin', 'youtube']):
+                href_lower = href.lower()
+                if any(skip in href_lower for skip in ['#', 'javascript:', 'mailto:', 'tel:', 'facebook', 'twitter', 'instagram', 'linkedin', 'youtube']):
                     continue
                 
                 # Look for blog-like URLs
-                if any(pattern in href.lower() for pattern in ['/blog/', '/post/', '/article/', '/news/']):
+                if any(pattern in href_lower for pattern in ['/blog/', '/post/', '/article/', '/news/']):
                     # Make sure it's not the blog listing page itself
                     if href.rstrip('/') != blog_url.rstrip('/'):
                         potential_links.append((href, title))
@@ -936,11 +2147,18 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
             logger.warning(f"Error parsing blog page {blog_url}: {e}")
             return []
     
-    def _parse_blog_response(self, content: str) -> Dict[str, Any]:
-        """Parse AI response into structured blog data"""
+    def _parse_blog_response(self, content: str, cities: tuple = None) -> Dict[str, Any]:
+        """
+        Parse AI response into structured blog data.
+        cities: (keyword_city, settings_city) for _fix_wrong_city; defaults to the
+        cities stored by the last _build_blog_prompt call.
+        """
         try:
-            # Check for empty content first
-            if not content or len(content.strip()) < 50:
+            # Check for empty content first. Stripping copies the whole response, so
+            # only do it when there is whitespace at the edges to strip
+            if not content or len(content) < 50 or (
+                (content[0].isspace() or content[-1].isspace()) and len(content.strip()) < 50
+            ):
                 logger.error(f"_parse_blog_response received empty/short content: '{content}'")
                 return {
                     'title': '',
@@ -951,27 +2169,25 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
             original_content = content
             logger.debug(f"Parsing blog response: {len(content)} chars")
             
-            # Clean markdown if present
-            if '```' in content:
-                parts = content.split('```')
-                for part in parts:
-                    part = part.strip()
-                    if part.startswith('json'):
-                        content = part[4:].strip()
-                        break
-                    elif part.startswith('{'):
-                        content = part
-                        break
-            
-            # Try to find JSON object if not starting with {
-            content = content.strip()
-            if not content.startswith('{'):
-                start = content.find('{')
-                end = content.rfind('}')
-                if start != -1 and end != -1 and end > start:
-                    content = content[start:end+1]
-            
-            data = json.loads(content)
+            # Drop a ```json fence first, so braces in chatter outside the fenced block
+            # can't widen the slice; then slice from the first { to the last }
+            unfenced = _strip_code_fence(content)
+            start = unfenced.find('{')
+            end = unfenced.rfind('}')
+            content = unfenced[start:end + 1] if start != -1 and end > start else unfenced
+            try:
+                data = _json_loads(content)
+            except json.JSONDecodeError:
+                if start == -1:
+                    raise
+                # Chatter with braces before or after the object — decode the object itself
+                data = _decode_blog_object(unfenced)
+                if data is None:
+                    # Cut off mid-object (e.g. max_tokens) — keep the members that did complete
+                    data = _recover_truncated_json(unfenced)
+                    if data is None:
+                        raise
+                    logger.warning(f"Recovered truncated blog JSON with keys: {list(data.keys())}")
             
             # Log what we got from JSON parse
             logger.info(f"JSON parsed successfully. Keys: {list(data.keys())}")
@@ -1000,9 +2216,9 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
                 text = text.replace('\\"', '"')
                 text = text.replace("\\'", "'")
                 # Remove stray backslashes that appear before tags
-                text = re.sub(r'\\+([<>])', r'\1', text)
+                text = _STRAY_TAG_BACKSLASH_RE.sub(r'\1', text)
                 # Remove backslashes before other chars
-                text = re.sub(r'\\([^\\])', r'\1', text)
+                text = _ESCAPED_CHAR_RE.sub(r'\1', text)
                 # Remove any remaining stray backslashes
                 text = text.replace('\\', '')
                 return text.strip()
@@ -1040,31 +2256,31 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
             # Final fallback - try to extract from the original content
             if not body_content or len(body_content.strip()) < 100:
                 logger.warning(f"Body still empty after alternatives, trying regex extraction")
-                body_match = re.search(r'"body"\s*:\s*"((?:[^"\\]|\\.)*)"|"body"\s*:\s*`((?:[^`\\]|\\.)*)`', original_content, re.DOTALL)
+                body_match = _BODY_STRING_RE.search(original_content) if '"body"' in original_content else None
                 if body_match:
                     body_content = body_match.group(1) or body_match.group(2) or ''
-                    body_content = body_content.replace('\\"', '"').replace('\\n', '\n').replace('\\/', '/')
+                    body_content = _unescape_json_string(body_content)
                     logger.info(f"Extracted body via regex: {len(body_content)} chars")
             
             # Update data with the extracted body
             data['body'] = body_content
             
             # Validate body content - make sure it's not accidentally containing JSON
+            # Leaked JSON shows up at the start or the tail of the body, so only the
+            # edges are checked rather than scanning the whole article
             body_content = data.get('body', '')
-            if body_content.strip().startswith('{') or '"title":' in body_content:
+            head = body_content[:_JSON_GUARD_WINDOW].lstrip()
+            tail = body_content[-_JSON_GUARD_WINDOW:]
+            if head.startswith('{') or '"title":' in head or '"title":' in tail:
                 logger.warning("Body appears to contain JSON - parsing may have failed")
                 # Try to extract just the text content
-                body_content = re.sub(r'[{}\[\]"]', '', body_content)
-                body_content = re.sub(r'(title|h1|meta_title|meta_description|body|h2_headings|h3_headings|faq_items|secondary_keywords|word_count)\s*:', '', body_content)
+                body_content = body_content.translate(_JSON_PUNCT_TT)
+                body_content = _KEY_STRIP_RE.sub('', body_content)
                 data['body'] = f"<p>{body_content[:500]}...</p>"
             
-            # Generate HTML if not present
-            if 'html' not in data and 'body' in data:
-                data['html'] = data['body']
-            
             # POST-PROCESS: Fix duplicate city names AND wrong city references
             data = self._fix_duplicate_cities(data)
-            data = self._fix_wrong_city(data)
+            data = self._fix_wrong_city(data, cities)
             
             logger.debug(f"Parsed blog: title='{data.get('title', '')[:30]}', body_len={len(data.get('body', ''))}")
             return data
@@ -1073,35 +2289,36 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
             logger.error(f"JSON parse error: {e}")
             logger.debug(f"Failed content: {content[:500]}")
             
+            # Plain prose or markdown (no JSON object) has no keys to recover
+            has_json = '{' in original_content
+            
             # Try to extract body content from the failed JSON
-            body_match = re.search(r'"body"\s*:\s*"(.*?)(?:"\s*,\s*"h2_headings|"\s*,\s*"faq_items|"\s*})', original_content, re.DOTALL)
-            if body_match:
-                extracted_body = body_match.group(1)
+            extracted_body = _extract_string_value(original_content, 'body') if has_json else None
+            if extracted_body:
                 # Unescape the JSON string
-                extracted_body = extracted_body.replace('\\"', '"').replace('\\n', '\n')
+                extracted_body = _unescape_json_string(extracted_body)
                 logger.info(f"Extracted body from failed JSON: {len(extracted_body)} chars")
             else:
                 # Fallback - try to get any paragraph content
-                p_match = re.search(r'<p>.*?</p>', original_content, re.DOTALL)
+                p_match = _P_RE.search(original_content)
                 if p_match:
                     extracted_body = original_content[p_match.start():]
                 else:
                     extracted_body = f"<p>Content generation encountered an error. Please try again.</p>"
             
             # Try to extract title
-            title_match = re.search(r'"title"\s*:\s*"([^"]+)"', original_content)
-            extracted_title = title_match.group(1) if title_match else ''
-            
-            # Try to extract meta
-            meta_title_match = re.search(r'"meta_title"\s*:\s*"([^"]+)"', original_content)
-            meta_desc_match = re.search(r'"meta_description"\s*:\s*"([^"]+)"', original_content)
+            extracted_title = extracted_meta_title = extracted_meta_description = ''
+            if has_json:
+                extracted_title = _extract_string_value(original_content, 'title') or ''
+                extracted_meta_title = _extract_string_value(original_content, 'meta_title') or ''
+                extracted_meta_description = _extract_string_value(original_content, 'meta_description') or ''
             
             return {
                 'title': extracted_title,
                 'h1': extracted_title,
                 'body': extracted_body,
-                'meta_title': meta_title_match.group(1) if meta_title_match else '',
-                'meta_description': meta_desc_match.group(1) if meta_desc_match else '',
+                'meta_title': extracted_meta_title,
+                'meta_description': extracted_meta_description,
                 'summary': '',
                 'key_takeaways': [],
                 'h2_headings': [],
@@ -1109,7 +2326,6 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
                 'faq_items': [],
                 'secondary_keywords': [],
                 'cta': {},
-                'html': extracted_body,
                 'parse_error': str(e)
             }
     
@@ -1119,52 +2335,22 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
         E.g., "Heating Repair Port Charlotte Port Charlotte, FL" -> "Heating Repair Port Charlotte, FL"
         E.g., "in Port Charlotte? in Port Charlotte" -> "in Port Charlotte"
         """
-        import re
-        
         def fix_duplicate(text, pattern_city):
             """Remove duplicate city occurrences"""
             if not text or not pattern_city:
                 return text
             
             original_text = text
-            city_lower = pattern_city.lower()
-            city_title = pattern_city.title()
-            
-            # Build regex-safe city name
-            city_escaped = re.escape(city_title)
-            city_escaped_lower = re.escape(city_lower)
             
-            # Patterns to fix (order matters - most specific first):
-            patterns = [
-                # "in Port Charlotte? in Port Charlotte" or "in Port Charlotte? in Port"
-                (rf'(in\s+{city_escaped}[?!.,]?)\s+in\s+{city_escaped}', r'\1', re.IGNORECASE),
-                # "in Port Charlotte in Port Charlotte" -> "in Port Charlotte"  
-                (rf'(in\s+{city_escaped})\s+in\s+{city_escaped}', r'\1', re.IGNORECASE),
-                # "Port Charlotte? in Port" (partial at end)
-                (rf'({city_escaped}[?!.,]?)\s+in\s+Port\b', r'\1', re.IGNORECASE),
-                # "Port Charlotte Port Charlotte" -> "Port Charlotte"
-                (rf'({city_escaped})\s+{city_escaped}', r'\1', re.IGNORECASE),
-                # "Port Charlotte in Port Charlotte" -> "Port Charlotte"
-                (rf'({city_escaped})\s+in\s+{city_escaped}', r'\1', re.IGNORECASE),
-                # "Port Charlotte for Port Charlotte" -> "Port Charlotte"  
-                (rf'({city_escaped})\s+for\s+{city_escaped}', r'\1', re.IGNORECASE),
-                # "Port Charlotte, FL in Port Charlotte" -> "Port Charlotte, FL"
-                (rf'({city_escaped},?\s*(?:FL|Florida)?)\s+in\s+{city_escaped}', r'\1', re.IGNORECASE),
-                # "for Port Charlotte in Port Charlotte" -> "for Port Charlotte"
-                (rf'(for\s+{city_escaped})\s+in\s+{city_escaped}', r'\1', re.IGNORECASE),
-                # Handle truncated city at end: "in Port$" when city is "Port Charlotte"
-                (rf'in\s+Port\s*$', '', re.IGNORECASE) if 'port' in city_lower else (r'$^', ''),
-            ]
-            
-            for pattern, replacement, *flags in patterns:
-                flag = flags[0] if flags else 0
-                text = re.sub(pattern, replacement, text, flags=flag)
+            # Patterns to fix (order matters - most specific first)
+            for pattern, replacement in _duplicate_city_patterns(pattern_city):
+                text = pattern.sub(replacement, text)
             
             # Clean up any trailing "in " at end of text
-            text = re.sub(r'\s+in\s*$', '', text)
+            text = _TRAILING_IN_RE.sub('', text)
             
             # Clean up double spaces
-            text = re.sub(r'\s{2,}', ' ', text)
+            text = _MULTI_SPACE_RE.sub(' ', text)
             
             if original_text != text:
                 logger.debug(f"Fixed duplicate: '{original_text[:60]}' -> '{text[:60]}'")
@@ -1179,23 +2365,21 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
             text = data.get(field, '')
             if text:
                 # Look for "City, STATE" pattern
-                match = re.search(r'in\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?),?\s*([A-Z]{2})?', text)
+                match = _CITY_AFTER_IN_RE.search(text)
                 if match:
                     city = match.group(1)
                     break
                 # Look for just city name followed by state
-                match = re.search(r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?),\s*(?:FL|Florida|TX|Texas|CA|California|[A-Z]{2})', text)
+                match = _CITY_BEFORE_STATE_RE.search(text)
                 if match:
                     city = match.group(1)
                     break
         
         if not city:
-            # Try extracting from common city names in the text
-            common_cities = ['Port Charlotte', 'Sarasota', 'Fort Myers', 'Naples', 'Tampa', 'Orlando', 
-                           'Jacksonville', 'Miami', 'Bradenton', 'Venice', 'Punta Gorda', 'North Port',
-                           'Cape Coral', 'Bonita Springs', 'Estero', 'Lehigh Acres']
-            for test_city in common_cities:
-                if test_city.lower() in str(data).lower():
+            # Try extracting from common city names in the text (stringified once, not per city)
+            data_lower = str(data).lower()
+            for test_city in _COMMON_CITIES:
+                if test_city.lower() in data_lower:
                     city = test_city
                     break
         
@@ -1216,17 +2400,18 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
         
         return data
     
-    def _fix_wrong_city(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def _fix_wrong_city(self, data: Dict[str, Any], cities: tuple = None) -> Dict[str, Any]:
         """
         Replace wrong city (from settings) with correct city (from keyword).
         E.g., If keyword is "AC Repair Sarasota" but content mentions "Port Charlotte",
         replace "Port Charlotte" with "Sarasota".
         """
-        import re
-        
-        # Get the cities we stored during prompt building
-        settings_city = getattr(self, '_last_settings_city', None)
-        keyword_city = getattr(self, '_last_keyword_city', None)
+        if cities:
+            keyword_city, settings_city = cities
+        else:
+            # Get the cities we stored during prompt building
+            settings_city = getattr(self, '_last_settings_city', None)
+            keyword_city = getattr(self, '_last_keyword_city', None)
         
         logger.info(f"_fix_wrong_city called: settings_city='{settings_city}', keyword_city='{keyword_city}'")
         
@@ -1280,41 +2465,135 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
         
         return data
     
-    def _call_with_retry(self, prompt: str, max_tokens: int = 2000, max_retries: int = 3, system_prompt: str = None, model: str = None, temperature: float = 0.7) -> Dict[str, Any]:
-        """Call Claude with retry logic — Claude only, no OpenAI fallback"""
+    def _call_with_retry(self, prompt: str, max_tokens: int = 2000, max_retries: int = 3, system_prompt: str = None, model: str = None, temperature: float = 0.7, stream_check: Callable[[str, int, float], Optional[str]] = None, cache: bool = False) -> Dict[str, Any]:
+        """
+        Call Claude with retry logic — Claude only, no OpenAI fallback
+
+        stream_check: optional callback(partial_text, new_from, elapsed_seconds) run while
+        the response streams in. Returning a reason string aborts the stream; it is retried
+        immediately only when the reason is a stall (_SLOW_STREAM_REASON).
+        cache: serve/store identical requests from the response cache (opt-in).
+        """
 
         if not self.anthropic_key:
             return {'error': 'ANTHROPIC_API_KEY not configured. Please set it in your environment variables.', 'error_code': 'auth_error'}
 
+        cache_key = None
+        if cache:
+            cache_key = _response_cache_key(model or 'claude-sonnet-4-6', temperature, max_tokens, system_prompt or '', prompt)
+            cached = _response_cache_get(cache_key)
+            if cached:
+                return cached
+
+        response = self._call_with_retry_uncached(prompt, max_tokens, max_retries, system_prompt, model, temperature, stream_check)
+
+        if cache_key and not response.get('error'):
+            _response_cache_put(cache_key, response)
+        return response
+
+    def _call_with_retry_uncached(self, prompt: str, max_tokens: int, max_retries: int, system_prompt: Optional[str], model: Optional[str], temperature: float, stream_check: Optional[Callable[[str, int, float], Optional[str]]]) -> Dict[str, Any]:
+        """Retry loop behind _call_with_retry"""
+
         for attempt in range(max_retries):
-            response = self._call_anthropic(prompt, max_tokens, system_prompt=system_prompt, model=model, temperature=temperature)
+            cooldown = _anthropic_cooldown_remaining()
+            if cooldown:
+                logger.info(f"Claude cooldown active, waiting {cooldown:.1f}s")
+                time.sleep(cooldown)
+            response = self._call_anthropic(prompt, max_tokens, system_prompt=system_prompt, model=model, temperature=temperature, stream_check=stream_check)
 
             if not response.get('error'):
                 return response
 
-            error_msg = str(response.get('error', '')).lower()
-            error_code = response.get('error_code', '')
+            wait_time = self._retry_delay(response, attempt, max_retries)
+            if wait_time is None:
+                return response
+            if wait_time:
+                time.sleep(wait_time)
+
+        # Keep the last failure's reason and error_code so callers can tell why
+        return {**response, 'error': f"Max retries exceeded for Claude API: {response['error']}"}
+    
+    async def _acall_with_retry(self, client, prompt: str, max_tokens: int = 2000, max_retries: int = 3, system_prompt: str = None, model: str = None, temperature: float = 0.7, stream_check: Callable[[str, int, float], Optional[str]] = None, cache: bool = False) -> Dict[str, Any]:
+        """Async version of _call_with_retry using a shared AsyncAnthropic client"""
+
+        if not self.anthropic_key:
+            return {'error': 'ANTHROPIC_API_KEY not configured. Please set it in your environment variables.', 'error_code': 'auth_error'}
+
+        cache_key = None
+        if cache:
+            cache_key = _response_cache_key(model or 'claude-sonnet-4-6', temperature, max_tokens, system_prompt or '', prompt)
+            cached = _response_cache_get(cache_key)
+            if cached:
+                return cached
+
+        response = await self._acall_with_retry_uncached(client, prompt, max_tokens, max_retries, system_prompt, model, temperature, stream_check)
+
+        if cache_key and not response.get('error'):
+            _response_cache_put(cache_key, response)
+        return response
 
-            # Never retry credit/auth errors
-            if error_code in ('credits_exhausted', 'auth_error'):
-                logger.warning(f"Claude credits/auth error — not retrying: {error_msg[:100]}")
+    async def _acall_with_retry_uncached(self, client, prompt: str, max_tokens: int, max_retries: int, system_prompt: Optional[str], model: Optional[str], temperature: float, stream_check: Optional[Callable[[str, int, float], Optional[str]]]) -> Dict[str, Any]:
+        """Retry loop behind _acall_with_retry"""
+
+        for attempt in range(max_retries):
+            cooldown = _anthropic_cooldown_remaining()
+            if cooldown:
+                logger.info(f"Claude cooldown active, waiting {cooldown:.1f}s")
+                await asyncio.sleep(cooldown)
+            response = await self._acall_anthropic(client, prompt, max_tokens, system_prompt=system_prompt, model=model, temperature=temperature, stream_check=stream_check)
+
+            if not response.get('error'):
                 return response
 
-            if 'rate' in error_msg or '429' in error_msg or 'overloaded' in error_msg:
-                wait_time = (attempt + 1) * 10
-                logger.warning(f"Claude rate limited, waiting {wait_time}s before retry {attempt + 1}/{max_retries}")
-                time.sleep(wait_time)
-                continue
+            wait_time = self._retry_delay(response, attempt, max_retries)
+            if wait_time is None:
+                return response
+            if wait_time:
+                await asyncio.sleep(wait_time)
 
-            # Non-retryable error — return immediately
-            logger.warning(f"Claude error (non-retryable): {error_msg[:100]}")
-            return response
+        # Keep the last failure's reason and error_code so callers can tell why
+        return {**response, 'error': f"Max retries exceeded for Claude API: {response['error']}"}
+    
+    def _retry_delay(self, response: Dict[str, Any], attempt: int, max_retries: int) -> Optional[float]:
+        """
+        Decide whether a failed Claude call should be retried.
+        Returns seconds to wait before the next attempt, or None to give up.
+        """
+        error_msg = str(response.get('error', '')).lower()
+        error_code = response.get('error_code', '')
+
+        # Never retry credit/auth errors
+        if error_code in ('credits_exhausted', 'auth_error'):
+            logger.warning(f"Claude credits/auth error — not retrying: {error_msg[:100]}")
+            return None
 
-        return {'error': 'Max retries exceeded for Claude API'}
+        # Stream was cancelled early. A stalled stream is retried right away; bad output
+        # such as placeholder text would most likely come back, so it isn't retried
+        if error_code == 'stream_aborted':
+            if response.get('abort_reason', '').startswith(_SLOW_STREAM_REASON):
+                logger.warning(f"Claude stream stalled, retrying {attempt + 1}/{max_retries}: {error_msg[:100]}")
+                return 0
+            logger.warning(f"Claude stream aborted on bad output — not retrying: {error_msg[:100]}")
+            return None
+
+        if 'rate' in error_msg or '429' in error_msg or 'overloaded' in error_msg:
+            # Honour the server's Retry-After; otherwise exponential backoff with jitter
+            # so workers that were limited together don't all retry together
+            wait_time = response.get('retry_after')
+            if not wait_time:
+                wait_time = min(_RETRY_MAX_SECONDS, _RETRY_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+            wait_time = min(wait_time, _RETRY_MAX_SECONDS)
+            logger.warning(f"Claude rate limited, waiting {wait_time:.1f}s before retry {attempt + 1}/{max_retries}")
+            _set_anthropic_cooldown(wait_time)
+            return wait_time
+
+        # Non-retryable error — return immediately
+        logger.warning(f"Claude error (non-retryable): {error_msg[:100]}")
+        return None
     
     # _call_openai removed — all content generation uses Claude exclusively
     
-    def _call_anthropic(self, prompt: str, max_tokens: int = 2000, system_prompt: str = None, model: str = None, temperature: float = 0.7) -> Dict[str, Any]:
+    def _call_anthropic(self, prompt: str, max_tokens: int = 2000, system_prompt: str = None, model: str = None, temperature: float = 0.7, stream_check: Callable[[str, int, float], Optional[str]] = None) -> Dict[str, Any]:
         """Call Anthropic Claude API (primary engine)"""
         if not self.anthropic_key:
             return {'error': 'Anthropic API key not configured'}
@@ -1323,29 +2602,53 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
         
         # Default system prompt if not provided
         if system_prompt is None:
-            system_prompt = 'You are an expert SEO content writer. Always respond with valid JSON when requested. Never wrap JSON in markdown code blocks.'
+            system_prompt = _DEFAULT_SYSTEM_PROMPT
+        
+        wait = self._rate_limit_delay(actual_model, system_prompt, prompt)
+        if wait:
+            time.sleep(wait)
         
         logger.info(f"Anthropic API call: model={actual_model}, max_tokens={max_tokens}")
         
         try:
-            import anthropic as _anthropic
-            client = _anthropic.Anthropic(api_key=self.anthropic_key, max_retries=0)  # _call_with_retry handles all retries
+            client = self._sync_client()
 
-            # Use streaming for large max_tokens to avoid timeout errors
-            if max_tokens > 8000:
-                logger.info(f"Using streaming for large request (max_tokens={max_tokens})")
-                content = ""
+            # Use streaming for large max_tokens to avoid timeout errors, and whenever
+            # the caller wants to inspect output as it arrives
+            if max_tokens > 8000 or stream_check:
+                logger.info(f"Using streaming for request (max_tokens={max_tokens})")
+                chunks = []
+                received = 0
+                checked = 0
+                started = last_check_at = time.monotonic()
+                abort_reason = None
                 with client.messages.stream(
                     model=actual_model,
                     max_tokens=max_tokens,
-                    system=system_prompt,
+                    system=_system_param(system_prompt),
                     messages=[
                         {'role': 'user', 'content': prompt}
                     ],
                     temperature=temperature,
                 ) as stream:
                     for text in stream.text_stream:
-                        content += text
+                        chunks.append(text)
+                        received += len(text)
+                        if not stream_check:
+                            continue
+                        now = time.monotonic()
+                        if received - checked >= _STREAM_CHECK_INTERVAL or now - last_check_at >= _STREAM_CHECK_SECONDS:
+                            abort_reason = stream_check(''.join(chunks), checked, now - started)
+                            checked = received
+                            last_check_at = now
+                            if abort_reason:
+                                # Leaving the context manager closes the HTTP response,
+                                # so we stop paying for tokens we'd throw away
+                                break
+                    if abort_reason:
+                        logger.warning(f"Anthropic stream aborted after {received} chars: {abort_reason}")
+                        return {'error': f'Stream aborted: {abort_reason}', 'error_code': 'stream_aborted', 'abort_reason': abort_reason}
+                content = ''.join(chunks)
                 final_message = stream.get_final_message()
                 stop_reason = final_message.stop_reason if final_message else None
                 usage_data = {}
@@ -1358,7 +2661,7 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
                 response = client.messages.create(
                     model=actual_model,
                     max_tokens=max_tokens,
-                    system=system_prompt,
+                    system=_system_param(system_prompt),
                     messages=[
                         {'role': 'user', 'content': prompt}
                     ],
@@ -1371,59 +2674,183 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
                     'output_tokens': response.usage.output_tokens,
                 }
 
-            # Track token usage via LiteLLM
-            if usage_data:
-                try:
-                    from app.services.token_tracker import track_usage
-                    track_usage(model=actual_model, input_tokens=usage_data.get('input_tokens', 0),
-                                output_tokens=usage_data.get('output_tokens', 0),
-                                feature='blog_generation')
-                except Exception:
-                    pass
+            return self._anthropic_result(content, stop_reason, usage_data, actual_model)
+            
+        except Exception as e:
+            return self._anthropic_error(e)
+    
+    def _sync_client(self):
+        """
+        Shared Anthropic client, so back-to-back calls and retries reuse its pooled
+        keep-alive connections instead of opening a new TLS connection each time.
+        Recreated if the API key changes.
+        """
+        key = self.anthropic_key
+        if self._client is None or self._client_key != key:
+            self._client = anthropic.Anthropic(api_key=key, max_retries=0)  # _call_with_retry handles all retries
+            self._client_key = key
+        return self._client
+    
+    def _async_client(self):
+        """
+        Create an AsyncAnthropic client. Use it as an async context manager so its
+        connection pool is closed with the event loop that owns it.
+        """
+        return anthropic.AsyncAnthropic(api_key=self.anthropic_key, max_retries=0)  # _acall_with_retry handles all retries
+    
+    async def _acall_anthropic(self, client, prompt: str, max_tokens: int = 2000, system_prompt: str = None, model: str = None, temperature: float = 0.7, stream_check: Callable[[str, int, float], Optional[str]] = None) -> Dict[str, Any]:
+        """Async version of _call_anthropic"""
+        if not self.anthropic_key:
+            return {'error': 'Anthropic API key not configured'}
+        
+        actual_model = model or 'claude-sonnet-4-6'
+        
+        if system_prompt is None:
+            system_prompt = _DEFAULT_SYSTEM_PROMPT
+        
+        wait = self._rate_limit_delay(actual_model, system_prompt, prompt)
+        if wait:
+            await asyncio.sleep(wait)
+        
+        logger.info(f"Anthropic API call (async): model={actual_model}, max_tokens={max_tokens}")
+        
+        try:
+            # Same rule as _call_anthropic: stream large requests and checked ones
+            if max_tokens > 8000 or stream_check:
+                logger.info(f"Using streaming for async request (max_tokens={max_tokens})")
+                chunks = []
+                received = 0
+                checked = 0
+                started = last_check_at = time.monotonic()
+                abort_reason = None
+                async with client.messages.stream(
+                    model=actual_model,
+                    max_tokens=max_tokens,
+                    system=_system_param(system_prompt),
+                    messages=[
+                        {'role': 'user', 'content': prompt}
+                    ],
+                    temperature=temperature,
+                ) as stream:
+                    async for text in stream.text_stream:
+                        chunks.append(text)
+                        received += len(text)
+                        if not stream_check:
+                            continue
+                        now = time.monotonic()
+                        if received - checked >= _STREAM_CHECK_INTERVAL or now - last_check_at >= _STREAM_CHECK_SECONDS:
+                            abort_reason = stream_check(''.join(chunks), checked, now - started)
+                            checked = received
+                            last_check_at = now
+                            if abort_reason:
+                                break
+                    if abort_reason:
+                        logger.warning(f"Anthropic stream aborted after {received} chars: {abort_reason}")
+                        return {'error': f'Stream aborted: {abort_reason}', 'error_code': 'stream_aborted', 'abort_reason': abort_reason}
+                    final_message = await stream.get_final_message()
+                content = ''.join(chunks)
+                stop_reason = final_message.stop_reason if final_message else None
+                usage_data = {}
+                if final_message and final_message.usage:
+                    usage_data = {
+                        'input_tokens': final_message.usage.input_tokens,
+                        'output_tokens': final_message.usage.output_tokens,
+                    }
+            else:
+                response = await client.messages.create(
+                    model=actual_model,
+                    max_tokens=max_tokens,
+                    system=_system_param(system_prompt),
+                    messages=[
+                        {'role': 'user', 'content': prompt}
+                    ],
+                    temperature=temperature,
+                )
+                content = response.content[0].text
+                stop_reason = response.stop_reason
+                usage_data = {
+                    'input_tokens': response.usage.input_tokens,
+                    'output_tokens': response.usage.output_tokens,
+                }
+            return self._anthropic_result(content, stop_reason, usage_data, actual_model)
+        except Exception as e:
+            return self._anthropic_error(e)
+    
+    def _track_anthropic_usage(self, usage_data: Dict[str, int], model: str):
+        """Track token usage via LiteLLM"""
+        if usage_data and track_usage:
+            try:
+                track_usage(model=model, input_tokens=usage_data.get('input_tokens', 0),
+                            output_tokens=usage_data.get('output_tokens', 0),
+                            feature='blog_generation')
+            except Exception:
+                pass
+    
+    def _anthropic_result(self, content: str, stop_reason: Optional[str], usage_data: Dict[str, int], model: str) -> Dict[str, Any]:
+        """Track usage and validate a completed Claude response"""
+        self._track_anthropic_usage(usage_data, model)
 
-            # Check for truncation
-            if stop_reason == 'max_tokens':
-                logger.warning(f"Anthropic response was truncated (stop_reason=max_tokens)")
+        # Check for truncation
+        if stop_reason == 'max_tokens':
+            logger.warning(f"Anthropic response was truncated (stop_reason=max_tokens)")
 
-            logger.info(f"Anthropic API success: content length={len(content)}, stop_reason={stop_reason}")
+        logger.info(f"Anthropic API success: content length={len(content)}, stop_reason={stop_reason}")
 
-            if not content or len(content) < 50:
-                logger.error(f"Anthropic returned very short content: '{content[:100]}'")
-                return {'error': 'Anthropic returned empty or very short content. Try again.'}
+        if not content or len(content) < 50:
+            logger.error(f"Anthropic returned very short content: '{content[:100]}'")
+            return {'error': 'Anthropic returned empty or very short content. Try again.'}
 
-            return {
-                'content': content,
-                'usage': usage_data,
-                'stop_reason': stop_reason
-            }
-            
-        except _anthropic.AuthenticationError as e:
+        return {
+            'content': content,
+            'usage': usage_data,
+            'stop_reason': stop_reason
+        }
+    
+    def _anthropic_error(self, e: Exception) -> Dict[str, Any]:
+        """Map an exception from the Anthropic SDK to an error response"""
+        if isinstance(e, anthropic.AuthenticationError):
             logger.error(f"Anthropic auth error: {e}")
             return {'error': 'Anthropic API key is invalid or expired.', 'error_code': 'auth_error'}
-        except _anthropic.RateLimitError as e:
+        if isinstance(e, anthropic.RateLimitError):
             error_msg = str(e).lower()
             logger.error(f"Anthropic rate limit: {e}")
             if 'credit' in error_msg or 'balance' in error_msg or 'billing' in error_msg:
                 return {'error': 'Anthropic API credits have been exhausted. Please add credits at console.anthropic.com.', 'error_code': 'credits_exhausted'}
-            return {'error': f'Anthropic rate limit exceeded. Please wait and try again.', 'error_code': 'rate_limit'}
-        except _anthropic.APIStatusError as e:
+            return {'error': f'Anthropic rate limit exceeded. Please wait and try again.', 'error_code': 'rate_limit',
+                    'retry_after': self._retry_after_seconds(e)}
+        if isinstance(e, anthropic.APIStatusError):
             error_msg = str(e).lower()
             logger.error(f"Anthropic API status error ({e.status_code}): {e}")
             if e.status_code == 402 or 'credit' in error_msg or 'billing' in error_msg:
                 return {'error': 'Anthropic API credits have been exhausted. Please add credits at console.anthropic.com.', 'error_code': 'credits_exhausted'}
-            return {'error': f'Anthropic API error: {str(e)[:200]}'}
-        except _anthropic.APIError as e:
+            return {'error': f'Anthropic API error: {str(e)[:200]}', 'retry_after': self._retry_after_seconds(e)}
+        if isinstance(e, anthropic.APIError):
             logger.error(f"Anthropic API error: {e}")
             return {'error': f'Anthropic API error: {str(e)[:200]}'}
-        except Exception as e:
-            logger.error(f"Anthropic unexpected error: {e}")
-            return {'error': f'Unexpected error calling Anthropic: {str(e)}'}
+        logger.error(f"Anthropic unexpected error: {e}")
+        return {'error': f'Unexpected error calling Anthropic: {str(e)}'}
+    
+    def _retry_after_seconds(self, e: Exception) -> Optional[float]:
+        """Read the server's Retry-After hint (seconds) from an API error, if any"""
+        response = getattr(e, 'response', None)
+        if response is None:
+            return None
+        headers = response.headers
+        try:
+            if headers.get('retry-after-ms'):
+                return float(headers['retry-after-ms']) / 1000
+            if headers.get('retry-after'):
+                return float(headers['retry-after'])
+        except (TypeError, ValueError):
+            pass  # HTTP-date form — fall back to our own backoff
+        return None
     
     def generate_with_agent(
         self,
         agent_name: str,
         user_input: str,
-        variables: Dict[str, str] = None
+        variables: Dict[str, str] = None,
+        cache: bool = False
     ) -> Dict[str, Any]:
         """
         Generate content using a configured agent
@@ -1432,22 +2859,28 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
             agent_name: Name of the agent to use (e.g., 'content_writer', 'review_responder')
             user_input: The user prompt/input
             variables: Variables to substitute in the system prompt
+            cache: Reuse an identical earlier response for up to an hour
+                   (off by default, so every call generates fresh).
             
         Returns:
             {content: str, usage: dict} or {error: str}
         """
-        from app.services.agent_service import agent_service
-        
-        agent = agent_service.get_agent(agent_name)
-        if not agent:
+        call_kwargs = self._agent_call_kwargs(agent_name, variables)
+        if call_kwargs is None:
             logger.warning(f"Agent '{agent_name}' not found, using default Claude call")
             return self._call_anthropic(user_input, max_tokens=2000)
 
+        # Claude only — no OpenAI fallback
+        return self._call_with_retry(prompt=user_input, cache=cache, **call_kwargs)
+    
+    def _agent_call_kwargs(self, agent_name: str, variables: Dict[str, str] = None) -> Optional[Dict[str, Any]]:
+        """Build _call_with_retry kwargs for an agent, or None if the agent doesn't exist"""
+        agent = _get_agent(agent_name)
+        if not agent:
+            return None
+
         # Get system prompt with variable substitution
-        system_prompt = agent.system_prompt
-        if variables:
-            for key, value in variables.items():
-                system_prompt = system_prompt.replace(f'{{{key}}}', str(value))
+        system_prompt = _substitute_prompt_vars(agent.system_prompt, variables)
 
         # Use Claude with a generous token limit for content generation
         # Cap at 16000 to allow full pages/blogs with JSON; min 2000 for short agents
@@ -1455,17 +2888,14 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
 
         logger.info(f"Using agent '{agent_name}' with Claude (tokens={fast_tokens})")
 
-        # Claude only — no OpenAI fallback
-        return self._call_with_retry(
-            prompt=user_input,
-            max_tokens=fast_tokens,
-            system_prompt=system_prompt,
-            temperature=agent.temperature
-        )
+        return {
+            'max_tokens': fast_tokens,
+            'system_prompt': system_prompt,
+            'temperature': agent.temperature,
+        }
     
     def generate_raw(self, prompt: str, max_tokens: int = 2000, model: str = None) -> str:
         """Generate raw text response (for simple prompts) — Claude only"""
-        self._rate_limit_delay()
         # Ignore any non-Claude model strings passed in (e.g. legacy gpt-4o-mini calls)
         claude_model = model if model and model.startswith('claude') else None
         result = self._call_anthropic(prompt, max_tokens, model=claude_model)
@@ -1478,7 +2908,6 @@ REMEMBER: Body must have {word_count}+ words, at least 5 internal <a href> links
         variables: Dict[str, str] = None
     ) -> str:
         """Generate raw text using an agent (convenience method)"""
-        self._rate_limit_delay()
         result = self.generate_with_agent(agent_name, user_input, variables)
         return result.get('content', '')
 
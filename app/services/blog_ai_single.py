@@ -22,6 +22,13 @@ from app.utils import sanitize_for_prompt
 
 logger = logging.getLogger(__name__)
 
+# orjson parses large model responses several times faster than stdlib json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 
 @dataclass
 class BlogRequest:
@@ -1614,7 +1621,7 @@ OUTPUT JSON:"""
 
     def _try_json_loads(self, s: str) -> Dict[str, Any]:
         try:
-            obj = json.loads(s)
+            obj = _json_loads(s)
             return obj if isinstance(obj, dict) else {}
         except Exception:
             return {}
@@ -1704,7 +1711,7 @@ OUTPUT JSON:"""
                 open_brackets = candidate.count('[') - candidate.count(']')
                 candidate += ']' * max(0, open_brackets) + '}' * max(0, open_braces)
                 try:
-                    obj = json.loads(candidate)
+                    obj = _json_loads(candidate)
                     if isinstance(obj, dict) and obj.get('body'):
                         logger.info(f"Truncated JSON recovered with body ({len(obj['body'])} chars)")
                         return candidate
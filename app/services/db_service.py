@@ -188,6 +188,10 @@ class DataService:
         except Exception:
             db.session.rollback()
             raise
+        if post.status == 'published':
+            # New published URL — let the next blog generation link to it
+            from app.services.ai_service import clear_related_posts_cache
+            clear_related_posts_cache(post.client_id)
         return post
     
     def get_blog_post(self, post_id: str) -> Optional[DBBlogPost]:
@@ -0,0 +1,842 @@
+"""
+MCP Framework - AI Service Tests
+"""
+import json
+import threading
+
+import pytest
+
+from app.services.ai_service import (
+    AIService,
+    _anthropic_cooldown_remaining,
+    _blog_stream_check,
+    clear_related_posts_cache,
+    clear_response_cache,
+    _gather_limited,
+    _TokenBucket,
+    _count_words_in_html,
+    _estimate_tokens,
+    _find_placeholder,
+    _get_agent,
+    clear_agent_cache,
+    _render_agent_prompt,
+    _RESPONSE_CACHE,
+    _set_anthropic_cooldown,
+    _substitute_prompt_vars,
+    _system_param,
+)
+
+
+class TestPromptVariables:
+    """Test agent prompt variable substitution"""
+    
+    def test_substitutes_known_variables(self):
+        prompt = _substitute_prompt_vars("Write in a {tone} tone for {industry}.", {'tone': 'friendly', 'industry': 'HVAC'})
+        
+        assert prompt == "Write in a friendly tone for HVAC."
+    
+    def test_leaves_unknown_variables_and_json(self):
+        template = 'Use {tone}. Return {"title": "string", "items": []} and keep {unknown}.'
+        prompt = _substitute_prompt_vars(template, {'tone': 'casual'})
+        
+        assert prompt == 'Use casual. Return {"title": "string", "items": []} and keep {unknown}.'
+    
+    def test_render_agent_prompt(self):
+        prompt = _render_agent_prompt("Tone: {tone}. Industry: {industry}.", 'professional', 'plumbing')
+        
+        assert prompt == "Tone: professional. Industry: plumbing."
+    
+    def test_agent_call_kwargs_substitutes_once(self, monkeypatch):
+        from types import SimpleNamespace
+        agent = SimpleNamespace(system_prompt='Write for {industry}. Return {"title": "{tone}"}', max_tokens=4000, temperature=0.5)
+        monkeypatch.setattr('app.services.ai_service._get_agent', lambda name: agent)
+        
+        kwargs = AIService()._agent_call_kwargs('content_writer', {'industry': 'HVAC', 'tone': 'friendly'})
+        
+        assert kwargs['system_prompt'] == 'Write for HVAC. Return {"title": "friendly"}'
+        assert kwargs['max_tokens'] == 4000
+
+
+
+class TestBlogPrompt:
+    """Test blog prompt assembly"""
+    
+    def test_prompt_fills_all_slots(self):
+        prompt = AIService()._build_blog_prompt(
+            keyword='ac repair', geo='Sarasota, FL', industry='hvac', word_count=1500,
+            tone='professional', business_name='Cool Air', include_faq=True, faq_count=5,
+            internal_links=[{'url': '/services', 'title': 'Our Services'}], usps=[],
+            phone='555-0100'
+        )
+        
+        assert '%(' not in prompt
+        assert 'TOPIC: Ac Repair' in prompt
+        assert 'CITY: Sarasota\nSTATE: FL' in prompt
+        assert '1. Our Services: /services' in prompt
+        assert 'Links to use: <a href="/services">Our Services</a>' in prompt
+        assert 'PHONE: 555-0100' in prompt
+        assert 'faq_schema' not in prompt
+
+
+
+class TestPlaceholderDetection:
+    """Test placeholder detection in generated content"""
+    
+    def test_finds_placeholder_case_insensitive(self):
+        assert _find_placeholder('<p>Intro</p><p>[SPECIFIC benefit here]</p>') == '[specific'
+    
+    def test_clean_text(self):
+        assert _find_placeholder('<p>Our technicians serve Sarasota every day.</p>') is None
+    
+    def test_returns_pattern_in_original_case(self):
+        assert _find_placeholder('answer 1 goes here') == 'Answer 1'
+        assert _find_placeholder('A real answer.') is None
+
+
+class TestBlogStreamCheck:
+    """Test the checks run on blog output while it streams in"""
+    
+    def _partial(self, key, words):
+        return '{"title": "AC Repair", "%s": "<p>%s' % (key, 'cooling ' * words)
+    
+    def test_body_under_content_key_is_not_slow(self):
+        assert _blog_stream_check(self._partial('content', 1400), 0, 31) is None
+    
+    def test_long_post_on_pace_is_not_aborted(self):
+        # 801 words of a 3,000-word post after 31s is a normal generation rate
+        assert _blog_stream_check(self._partial('body', 801), 0, 31) is None
+    
+    def test_stalled_stream_aborted(self):
+        reason = _blog_stream_check(self._partial('body', 40), 0, 31)
+        
+        assert reason.startswith('too slow:')
+    
+    def test_not_judged_before_grace_period(self):
+        assert _blog_stream_check(self._partial('body', 5), 0, 10) is None
+    
+    def test_placeholder_under_any_body_key(self):
+        partial = '{"title": "AC Repair", "html": "<p>Intro</p><p>[specific benefit]</p>'
+        
+        assert _blog_stream_check(partial, 0, 5) == "placeholder text '[specific' in body"
+    
+    def _aborting_service(self, monkeypatch, reason, calls):
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test-key')
+        service = AIService()
+        
+        def fake_call(prompt, max_tokens, **kwargs):
+            calls.append(prompt)
+            return {'error': f'Stream aborted: {reason}', 'error_code': 'stream_aborted', 'abort_reason': reason}
+        
+        monkeypatch.setattr(service, '_call_anthropic', fake_call)
+        return service
+    
+    def test_placeholder_abort_not_retried(self, monkeypatch):
+        calls = []
+        service = self._aborting_service(monkeypatch, "placeholder text '[specific' in body", calls)
+        
+        result = service._call_with_retry('Write a blog', stream_check=_blog_stream_check)
+        
+        assert len(calls) == 1
+        assert result['error_code'] == 'stream_aborted'
+        assert "placeholder text '[specific'" in result['error']
+    
+    def _fake_async_client(self, chunks):
+        from types import SimpleNamespace
+        
+        class FakeStream:
+            async def __aenter__(self):
+                return self
+            
+            async def __aexit__(self, *exc):
+                return False
+            
+            @property
+            async def text_stream(self):
+                for chunk in chunks:
+                    yield chunk
+            
+            async def get_final_message(self):
+                return SimpleNamespace(stop_reason='end_turn', usage=SimpleNamespace(input_tokens=10, output_tokens=20))
+        
+        # No messages.create: large requests must go through the stream
+        return SimpleNamespace(messages=SimpleNamespace(stream=lambda **kwargs: FakeStream()))
+    
+    def test_async_large_request_streams(self, monkeypatch):
+        import asyncio
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test-key')
+        client = self._fake_async_client(['{"body": "<p>', 'cooling ' * 20, '</p>"}'])
+        service = AIService()
+        monkeypatch.setattr(service, '_track_anthropic_usage', lambda usage, model: None)
+        
+        result = asyncio.run(service._acall_anthropic(client, 'Write a blog', max_tokens=12000))
+        
+        assert result['content'].startswith('{"body": "<p>cooling')
+        assert result['usage'] == {'input_tokens': 10, 'output_tokens': 20}
+    
+    def test_async_stream_check_aborts(self, monkeypatch):
+        import asyncio
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test-key')
+        monkeypatch.setattr('app.services.ai_service._STREAM_CHECK_INTERVAL', 10)
+        client = self._fake_async_client(['{"body": "<p>Intro</p>', '<p>[specific benefit]</p>', ' never read'])
+        
+        result = asyncio.run(AIService()._acall_anthropic(client, 'Write a blog', max_tokens=4000, stream_check=_blog_stream_check))
+        
+        assert result['error_code'] == 'stream_aborted'
+        assert result['abort_reason'] == "placeholder text '[specific' in body"
+    
+    def test_stalled_stream_retried_and_reason_kept(self, monkeypatch):
+        calls = []
+        service = self._aborting_service(monkeypatch, 'too slow: 2.6 tokens/s after 31s (need 8)', calls)
+        
+        result = service._call_with_retry('Write a blog', stream_check=_blog_stream_check)
+        
+        assert len(calls) == 3
+        assert result['error'].startswith('Max retries exceeded for Claude API: Stream aborted: too slow')
+        assert result['error_code'] == 'stream_aborted'
+
+
+
+class TestWordCount:
+    """Test HTML word counting"""
+    
+    def test_counts_visible_words(self):
+        html = '<h2>Cost of AC Repair</h2><p>Call <a href="/contact">our team</a>\ntoday.</p>'
+        
+        assert _count_words_in_html(html) == 8
+    
+    def test_empty(self):
+        assert _count_words_in_html('') == 0
+    
+    def test_adjacent_tags_split_words(self):
+        assert _count_words_in_html('<p>One two</p><p>three</p>') == 3
+    
+    def test_entities_are_not_separators(self):
+        assert _count_words_in_html('<p>AC&nbsp;repair in Tampa</p>') == 3
+
+
+
+class TestRateLimitCooldown:
+    """Test the shared Claude rate-limit cooldown"""
+    
+    def test_rate_limit_sets_shared_cooldown(self, monkeypatch):
+        monkeypatch.setattr('app.services.ai_service._ANTHROPIC_COOLDOWN_UNTIL', 0.0)
+        assert _anthropic_cooldown_remaining() == 0
+        
+        wait = AIService()._retry_delay({'error': 'Claude rate limit exceeded'}, 0, 3)
+        
+        assert 2.5 <= wait <= 5
+        assert wait - 1 < _anthropic_cooldown_remaining() <= wait
+    
+    def test_backoff_grows_and_is_capped(self, monkeypatch):
+        monkeypatch.setattr('app.services.ai_service._ANTHROPIC_COOLDOWN_UNTIL', 0.0)
+        service = AIService()
+        
+        assert 10 <= service._retry_delay({'error': 'overloaded'}, 2, 3) <= 20
+        assert service._retry_delay({'error': 'overloaded'}, 10, 11) <= 60
+    
+    def test_retry_after_header_is_honoured(self, monkeypatch):
+        monkeypatch.setattr('app.services.ai_service._ANTHROPIC_COOLDOWN_UNTIL', 0.0)
+        import anthropic
+        import httpx
+        
+        request = httpx.Request('POST', 'https://api.anthropic.com/v1/messages')
+        response = httpx.Response(429, headers={'retry-after': '3'}, request=request)
+        error = anthropic.RateLimitError('rate limited', response=response, body=None)
+        service = AIService()
+        result = service._anthropic_error(error)
+        
+        assert result['retry_after'] == 3.0
+        assert service._retry_delay(result, 0, 3) == 3.0
+    
+    def test_cooldown_never_shortened(self, monkeypatch):
+        monkeypatch.setattr('app.services.ai_service._ANTHROPIC_COOLDOWN_UNTIL', 0.0)
+        
+        _set_anthropic_cooldown(30)
+        _set_anthropic_cooldown(5)
+        
+        assert _anthropic_cooldown_remaining() > 25
+
+
+class TestBlogRequest:
+    """Test assembly of the blog generation request"""
+    
+    def _prepare(self, links):
+        return AIService()._prepare_blog_request(
+            keyword='ac repair', geo='Sarasota, FL', industry='hvac', word_count=1000,
+            tone='professional', business_name='Cool Air', include_faq=True, faq_count=5,
+            internal_links=links, usps=[], contact_name=None, phone=None, email=None,
+            related_posts=[], client_id=None
+        )
+    
+    def test_includes_all_links_and_output_budget(self):
+        request = self._prepare([{'url': f'/page-{i}', 'title': f'Page {i}'} for i in range(6)])
+        
+        assert '/page-3' in request['prompt']
+        assert request['max_tokens'] == 4500
+    
+    def test_static_instructions_are_cached_system_prefix(self):
+        request = self._prepare([])
+        system = _system_param(request['system_prompt'])
+        
+        assert '(target 1-2% density)' in request['system_prompt']
+        assert '<<TOPIC>>' in request['system_prompt']
+        assert 'Ac Repair' not in request['system_prompt']
+        assert 'Ac Repair' in request['prompt']
+        assert system[0]['cache_control'] == {'type': 'ephemeral'}
+    
+    def test_token_estimate_is_local(self):
+        assert _estimate_tokens('') == 0
+        assert _estimate_tokens('x' * 4000) == 1000
+
+
+class TestTokenBucket:
+    """Test the client-side Claude rate limiter"""
+    
+    def test_no_wait_while_budget_remains(self):
+        bucket = _TokenBucket(60)
+        
+        assert all(bucket.reserve(1) == 0 for _ in range(60))
+    
+    def test_waits_for_refill_once_empty(self):
+        bucket = _TokenBucket(60)
+        bucket.reserve(60)
+        
+        assert 1.9 < bucket.reserve(2) <= 2.0
+    
+    def test_oversized_request_capped_at_capacity(self):
+        bucket = _TokenBucket(600)
+        
+        assert bucket.reserve(5000) == 0
+        assert 0.09 < bucket.reserve(1) <= 0.1
+
+
+class TestConcurrencyLimit:
+    """Test the bounded fan-out used for concurrent Claude calls"""
+    
+    def test_limits_in_flight_calls_and_keeps_order(self, monkeypatch):
+        import asyncio
+        monkeypatch.setattr('app.services.ai_service._LLM_MAX_CONCURRENCY', 2)
+        in_flight = []
+        peak = []
+        
+        async def call(i):
+            in_flight.append(i)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(i)
+            return i
+        
+        results = asyncio.run(_gather_limited([call(i) for i in range(5)]))
+        
+        assert results == [0, 1, 2, 3, 4]
+        assert max(peak) == 2
+    
+    def test_generate_blog_posts_refuses_running_loop(self):
+        import asyncio
+        service = AIService()
+        
+        async def from_loop():
+            with pytest.raises(RuntimeError, match='agenerate_blog_posts'):
+                service.generate_blog_posts([{'keyword': 'ac repair', 'geo': 'Tampa, FL', 'industry': 'hvac'}])
+        
+        asyncio.run(from_loop())
+    
+    def test_social_kit_inside_running_loop_falls_back_to_sequential(self, monkeypatch):
+        import asyncio
+        service = AIService()
+        calls = []
+        monkeypatch.setattr(service, 'generate_social_kit_batched', lambda **kwargs: {'gbp': {'text': 'batched'}})
+        
+        def fake_post(topic, platform, **kwargs):
+            calls.append(platform)
+            return {'text': platform}
+        
+        monkeypatch.setattr(service, 'generate_social_post', fake_post)
+        
+        async def from_loop():
+            return service.generate_social_kit('AC tips', 'Cool Co', 'hvac', 'Tampa, FL',
+                                               platforms=['gbp', 'facebook', 'instagram'])
+        
+        kit = asyncio.run(from_loop())
+        
+        assert calls == ['facebook', 'instagram']
+        assert kit == {'gbp': {'text': 'batched'}, 'facebook': {'text': 'facebook'}, 'instagram': {'text': 'instagram'}}
+
+
+class TestPromptCaching:
+    """Test cache_control marking of Claude system prompts"""
+    
+    def test_short_system_prompt_sent_as_string(self):
+        assert _system_param('You are an SEO writer.') == 'You are an SEO writer.'
+    
+    def test_long_system_prompt_marked_for_caching(self):
+        prompt = 'Follow the house style guide for every heading and paragraph. ' * 200
+        
+        assert _system_param(prompt) == [{'type': 'text', 'text': prompt, 'cache_control': {'type': 'ephemeral'}}]
+
+
+class TestH2Locations:
+    """Test location fix-up of H2 headings"""
+    
+    def test_adds_location_by_heading_type(self):
+        content = ('<h2>Why Choose Us</h2><h2>Benefits of AC Repair</h2>'
+                   '<h2>AC Repair Costs</h2><h2>Our Team</h2><h2>Serving Tampa</h2>')
+        
+        fixed = AIService()._fix_h2_locations(content, 'Tampa', 'ac repair')
+        
+        assert fixed == ('<h2>Why Choose Us in Tampa</h2><h2>Benefits of AC Repair for Tampa Residents</h2>'
+                         '<h2>AC Repair Costs in the Tampa Area</h2><h2>Our Team in Tampa</h2><h2>Serving Tampa</h2>')
+    
+    def test_geo_in_body_text_does_not_skip_headings(self):
+        content = '<p>Tampa Tampa Tampa</p><h2>Our Team</h2>'
+        
+        assert AIService()._fix_h2_locations(content, 'Tampa', 'ac repair') == '<p>Tampa Tampa Tampa</p><h2>Our Team in Tampa</h2>'
+    
+    def test_no_headings_returned_unchanged(self):
+        content = '<p>Cool air for every home.</p>'
+        
+        assert AIService()._fix_h2_locations(content, 'Tampa', 'ac repair') is content
+
+
+class TestDuplicateCities:
+    """Test collapsing of repeated city names in generated copy"""
+    
+    def test_collapses_repeats_in_titles_and_body(self):
+        data = {
+            'title': 'Heating Repair Port Charlotte Port Charlotte, FL',
+            'meta_description': 'Fast repairs in Port Charlotte? in Port Charlotte',
+            'body': '<p>Serving Port Charlotte for Port Charlotte  homes.</p>',
+        }
+        
+        fixed = AIService()._fix_duplicate_cities(data)
+        
+        assert fixed['title'] == 'Heating Repair Port Charlotte, FL'
+        assert fixed['meta_description'] == 'Fast repairs in Port Charlotte?'
+        assert fixed['body'] == '<p>Serving Port Charlotte homes.</p>'
+    
+    def test_falls_back_to_known_city_names(self):
+        data = {'title': 'Best AC Repair', 'body': '<p>Trusted across naples naples and beyond.</p>'}
+        
+        assert AIService()._fix_duplicate_cities(data)['body'] == '<p>Trusted across naples and beyond.</p>'
+
+
+
+class TestRelatedPostsCache:
+    """Test caching of related-post lookups"""
+    
+    def test_cached_per_client_and_keyword(self, monkeypatch):
+        clear_related_posts_cache()
+        calls = []
+        
+        def fake_fetch(client_id, keyword, limit):
+            calls.append((client_id, keyword))
+            return [{'title': 'Post', 'url': '/post', 'keyword': 'post'}]
+        
+        service = AIService()
+        monkeypatch.setattr(service, '_fetch_related_posts', fake_fetch)
+        
+        service._get_related_posts('client-1', 'AC Repair')
+        service._get_related_posts('client-1', 'ac repair')
+        service._get_related_posts('client-2', 'ac repair')
+        
+        assert calls == [('client-1', 'AC Repair'), ('client-2', 'ac repair')]
+        
+        clear_related_posts_cache('client-1')
+        service._get_related_posts('client-1', 'ac repair')
+        
+        assert len(calls) == 3
+    
+    def test_errors_not_cached(self, monkeypatch):
+        clear_related_posts_cache()
+        service = AIService()
+        monkeypatch.setattr(service, '_fetch_related_posts', lambda *args: None)
+        
+        assert service._get_related_posts('client-1', 'ac repair') == []
+        
+        monkeypatch.setattr(service, '_fetch_related_posts', lambda *args: [{'title': 'T', 'url': '/t', 'keyword': 't'}])
+        
+        assert len(service._get_related_posts('client-1', 'ac repair')) == 1
+    
+    def test_evicts_least_recently_used(self, monkeypatch):
+        clear_related_posts_cache()
+        monkeypatch.setattr('app.services.ai_service._RELATED_POSTS_CACHE_MAX_ENTRIES', 2)
+        calls = []
+        
+        def fake_fetch(client_id, keyword, limit):
+            calls.append(keyword)
+            return []
+        
+        service = AIService()
+        monkeypatch.setattr(service, '_fetch_related_posts', fake_fetch)
+        
+        service._get_related_posts('client-1', 'ac repair')
+        service._get_related_posts('client-1', 'heat pump')
+        service._get_related_posts('client-1', 'ac repair')  # hit, now most recent
+        service._get_related_posts('client-1', 'duct cleaning')  # evicts heat pump
+        service._get_related_posts('client-1', 'ac repair')
+        service._get_related_posts('client-1', 'heat pump')
+        
+        assert calls == ['ac repair', 'heat pump', 'duct cleaning', 'heat pump']
+
+
+class TestAgentCache:
+    """Test the in-memory agent config cache"""
+    
+    def test_missing_agent_not_cached(self, monkeypatch):
+        from types import SimpleNamespace
+        clear_agent_cache()
+        found = {}
+        monkeypatch.setattr('app.services.ai_service.agent_service',
+                            SimpleNamespace(get_agent=lambda name: found.get(name)))
+        
+        assert _get_agent('writer_b') is None
+        
+        found['writer_b'] = SimpleNamespace(name='writer_b', system_prompt='Write.', model='claude-sonnet-4-6',
+                                            temperature=0.7, max_tokens=4000)
+        
+        assert _get_agent('writer_b').system_prompt == 'Write.'
+        clear_agent_cache()
+
+
+class TestSocialFallback:
+    """Test the raw-text fallback for unparseable social posts"""
+    
+    def test_json_in_fence_with_trailing_braces(self):
+        content = 'Here you go:\n```json\n{"text": "Stay cool this summer!", "hashtags": ["#HVAC"]}\n```\nNeed a {tone} change?'
+        result = AIService()._parse_social_response({'content': content}, 'AC tips', 'Cool Air', 'hvac', 'Tampa, FL', 500, 5)
+        
+        assert result == {'text': 'Stay cool this summer!', 'hashtags': ['HVAC']}
+    
+    def test_example_matches_industry(self, monkeypatch):
+        monkeypatch.setattr('app.services.ai_service._get_agent', lambda name: None)
+        service = AIService()
+        
+        plumbing = service._build_social_request('Drain tips', 'facebook', 'Flow Co', 'Plumbing Services', 'Tampa, FL', 'friendly', True, 5, '')
+        other = service._build_social_request('Lawn tips', 'facebook', 'Green Co', 'landscaping', 'Tampa, FL', 'friendly', True, 5, '')
+        
+        assert 'Example for plumbing business:' in plumbing['prompt']
+        assert 'HVAC' not in plumbing['prompt']
+        assert 'Example for a local service business:' in other['prompt']
+    
+    def test_fallback_hashtags_skip_whitespace_and_empty_values(self):
+        result = AIService()._parse_social_response(
+            {'content': 'Great tips for summer cooling!'}, 'AC tips', 'Cool  Air', 'hvac\tservices', '', 500, 5
+        )
+        
+        assert result['text'] == 'Great tips for summer cooling!'
+        assert result['hashtags'] == ['hvacservices', 'CoolAir']
+
+
+class TestSocialKit:
+    """Test single-call social kit generation"""
+    
+    def test_one_call_with_individual_fallback(self, monkeypatch):
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test-key')
+        monkeypatch.setattr('app.services.ai_service._get_agent', lambda name: None)
+        service = AIService()
+        prompts = []
+        
+        def fake_call(prompt, max_tokens, **kwargs):
+            prompts.append(prompt)
+            posts = {
+                'gbp': {'text': 'Beat the Tampa heat with a tune-up.', 'hashtags': ['#HVAC', 'Tampa']},
+                'facebook': {'text': 'Is your AC ready for summer?', 'hashtags': ['ACRepair']},
+                'linkedin': {'text': ''},
+            }
+            return {'content': '```json\n' + json.dumps(posts) + '\n```', 'usage': {}, 'stop_reason': 'end_turn'}
+        
+        fallback_platforms = []
+        
+        async def fake_individual(**kwargs):
+            fallback_platforms.extend(kwargs['platforms'])
+            return {platform: {'text': f'{platform} post'} for platform in kwargs['platforms']}
+        
+        monkeypatch.setattr(service, '_call_anthropic', fake_call)
+        monkeypatch.setattr(service, 'agenerate_social_kit', fake_individual)
+        
+        kit = service.generate_social_kit('AC tune-ups', 'Cool Air', 'hvac', 'Tampa, FL',
+                                          platforms=['gbp', 'facebook', 'linkedin'])
+        
+        assert len(prompts) == 1
+        assert 'linkedin: 700 characters max' in prompts[0]
+        assert list(kit) == ['gbp', 'facebook', 'linkedin']
+        assert kit['gbp']['hashtags'] == ['HVAC', 'Tampa']
+        assert fallback_platforms == ['linkedin']
+
+
+class TestConcurrentBlogs:
+    """Test concurrent blog generation"""
+    
+    def test_each_blog_fixes_its_own_city(self, monkeypatch):
+        import contextlib
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test-key')
+        service = AIService()
+        body = '<h2>AC Repair</h2><p>' + 'Trusted cooling service across Port Charlotte homes. ' * 10 + '</p>'
+        
+        async def fake_call(client, prompt, **kwargs):
+            return {'content': json.dumps({'title': 'AC Repair Port Charlotte', 'body': body}), 'usage': {}}
+        
+        @contextlib.asynccontextmanager
+        async def fake_client():
+            yield None
+        
+        monkeypatch.setattr(service, '_acall_with_retry', fake_call)
+        monkeypatch.setattr(service, '_async_client', fake_client)
+        
+        results = service.generate_blog_posts([
+            {'keyword': 'ac repair sarasota', 'geo': 'Port Charlotte, FL', 'industry': 'hvac'},
+            {'keyword': 'ac repair naples', 'geo': 'Port Charlotte, FL', 'industry': 'hvac'},
+        ])
+        
+        assert 'Sarasota homes' in results[0]['body']
+        assert 'Naples homes' in results[1]['body']
+    
+    def test_html_aliases_final_body(self, monkeypatch):
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test-key')
+        service = AIService()
+        body = '<h2>AC Repair</h2><p>' + 'Trusted cooling service across Port Charlotte homes. ' * 10 + '</p>'
+        response = {'content': json.dumps({'title': 'AC Repair', 'body': body})}
+        
+        result = service._finish_blog_post(response, 'ac repair', 'Sarasota, FL', 'hvac', 1200, '', [])
+        
+        assert result['html'] is result['body']
+        assert 'Sarasota' in result['html']
+    
+    def test_faq_schema_derived_from_faq_items(self, monkeypatch):
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test-key')
+        body = '<h2>AC Repair</h2><p>' + 'Trusted cooling service for local homes. ' * 10 + '</p>'
+        faqs = [{'question': 'How much does AC repair cost?', 'answer': 'Most repairs in Tampa run a few hundred dollars.'}]
+        response = {'content': json.dumps({'title': 'AC Repair', 'body': body, 'faq_items': faqs})}
+        
+        result = AIService()._finish_blog_post(response, 'ac repair', 'Tampa', 'hvac', 1200, '', [])
+        
+        assert result['faq_schema'] == {
+            '@context': 'https://schema.org',
+            '@type': 'FAQPage',
+            'mainEntity': [{
+                '@type': 'Question',
+                'name': 'How much does AC repair cost?',
+                'acceptedAnswer': {'@type': 'Answer', 'text': 'Most repairs in Tampa run a few hundred dollars.'},
+            }],
+        }
+    
+    def test_word_count_reflects_post_processed_body(self, monkeypatch):
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test-key')
+        body = '<h2>Our Team</h2><p>' + 'Trusted cooling service for local homes. ' * 10 + '</p>'
+        response = {'content': json.dumps({'title': 'AC Repair', 'body': body})}
+        
+        result = AIService()._finish_blog_post(response, 'ac repair', 'Tampa', 'hvac', 1200, '', [])
+        
+        assert '<h2>Our Team in Tampa</h2>' in result['body']
+        assert result['word_count'] == result['actual_word_count'] + 2 == _count_words_in_html(result['body'])
+
+
+class TestParseBlogResponse:
+    """Test parsing of blog JSON returned by the model"""
+    
+    def _response(self, prefix='', suffix=''):
+        import json
+        body = '<h2>AC Repair in Tampa</h2><p>' + 'Cool air for every home in Tampa. ' * 10 + '</p>'
+        return prefix + json.dumps({'title': 'AC Repair Tampa', 'meta_title': 'AC Repair', 'body': body}) + suffix
+    
+    def test_plain_json(self):
+        data = AIService()._parse_blog_response(self._response())
+        
+        assert data['title'] == 'AC Repair Tampa'
+        assert data['body'].startswith('<h2>AC Repair in Tampa</h2>')
+        assert 'parse_error' not in data
+    
+    def test_markdown_fence_and_chatter(self):
+        data = AIService()._parse_blog_response(self._response('Here is the post:\n```json\n', '\n```'))
+        
+        assert data['title'] == 'AC Repair Tampa'
+        assert 'parse_error' not in data
+    
+    def test_trailing_text_with_braces(self):
+        data = AIService()._parse_blog_response(self._response('```json\n', '\n```\nWant changes to {tone}?'))
+        
+        assert data['meta_title'] == 'AC Repair'
+        assert 'parse_error' not in data
+    
+    def test_braces_in_preamble_around_fenced_json(self):
+        data = AIService()._parse_blog_response(
+            self._response('Using your {tone} settings:\n```json\n', '\n```\nWant another {variant}?'))
+        
+        assert data['meta_title'] == 'AC Repair'
+        assert 'parse_error' not in data
+    
+    def test_braces_in_unfenced_chatter(self):
+        data = AIService()._parse_blog_response(
+            self._response('Here is the {tone} post: ', ' Let me know about {changes}.'))
+        
+        assert data['meta_title'] == 'AC Repair'
+        assert 'parse_error' not in data
+    
+    def test_fence_inside_body_left_alone(self):
+        content = json.dumps({'title': 'AC Repair Tampa', 'body': '<p>Run ```reset``` on the thermostat.</p>' * 5})
+        
+        data = AIService()._parse_blog_response(content)
+        
+        assert data['body'].startswith('<p>Run ```reset``` on the thermostat.</p>')
+    
+    def test_truncated_json_keeps_completed_fields(self):
+        full = self._response(suffix='')[:-1] + ', "faq_items": [{"question": "How much does AC repair cost?", "answer": "It dep'
+        data = AIService()._parse_blog_response(full)
+        
+        assert data['title'] == 'AC Repair Tampa'
+        assert data['meta_title'] == 'AC Repair'
+        assert data['body'].endswith('</p>')
+        assert 'faq_items' not in data
+        assert 'parse_error' not in data
+    
+    def test_truncated_body_falls_back(self):
+        data = AIService()._parse_blog_response(self._response()[:200])
+        
+        assert 'parse_error' in data
+        assert data['title'] == 'AC Repair Tampa'
+    
+    def test_fallback_scans_escaped_strings(self):
+        # Raw newline inside the body string makes the otherwise complete JSON invalid
+        content = ('{"title": "The \\"Best\\" AC Repair", "meta_title": "AC Repair", '
+                   '"body": "<p>Call \\"Cool Air\\"\ntoday.</p>", "faq_items": []}')
+        data = AIService()._parse_blog_response(content)
+        
+        assert 'parse_error' in data
+        assert data['title'] == 'The \\"Best\\" AC Repair'
+        assert data['meta_title'] == 'AC Repair'
+        assert data['body'] == '<p>Call "Cool Air"\ntoday.</p>'
+    
+    def test_fallback_decodes_all_body_escapes(self):
+        content = ('{"title": "Café Cooling", "body": "<p>Caf\\u00e9 Cooling\\t\\u2014 '
+                   'résumé <a href=\\"\\/contact\\">call</a>\ntoday.</p>", "faq_items": []}')
+        data = AIService()._parse_blog_response(content)
+        
+        assert 'parse_error' in data
+        assert data['body'] == '<p>Café Cooling\t\u2014 résumé <a href="/contact">call</a>\ntoday.</p>'
+
+    def test_fallback_keeps_body_with_unescaped_href(self):
+        body = ('<h2>AC Repair</h2><p>See our <a href="/services/ac-repair">AC repair</a> page. '
+                + 'Cool air for every home in Tampa. ' * 10 + '</p>')
+        content = ('{"title": "AC Repair Tampa", "meta_title": "AC Repair", "body": "' + body + '", '
+                   '"faq_items": [{"question": "Cost?", "answer": "It depends."}]}')
+        data = AIService()._parse_blog_response(content)
+        
+        assert 'parse_error' in data
+        assert data['title'] == 'AC Repair Tampa'
+        assert data['body'] == body
+
+    def test_prose_without_json_keeps_paragraphs(self):
+        content = 'Sure! Here is your post.\n\n<p>' + 'Cool air for every home in Tampa. ' * 5 + '</p>'
+        data = AIService()._parse_blog_response(content)
+
+        assert 'parse_error' in data
+        assert data['title'] == ''
+        assert data['body'].startswith('<p>Cool air')
+
+
+
+class TestResponseCache:
+    """Test caching of identical low-temperature Claude calls"""
+    
+    def _service(self, monkeypatch, calls):
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test-key')
+        service = AIService()
+        
+        def fake_call(prompt, max_tokens, **kwargs):
+            calls.append(prompt)
+            return {'content': f'response {len(calls)}', 'usage': {}, 'stop_reason': 'end_turn'}
+        
+        monkeypatch.setattr(service, '_call_anthropic', fake_call)
+        return service
+    
+    def test_calls_not_cached_by_default(self, monkeypatch):
+        clear_response_cache()
+        calls = []
+        service = self._service(monkeypatch, calls)
+        
+        service._call_with_retry('Analyze keywords', temperature=0.3)
+        service._call_with_retry('Analyze keywords', temperature=0.3)
+        
+        assert len(calls) == 2
+    
+    def test_opted_in_calls_cached(self, monkeypatch):
+        clear_response_cache()
+        calls = []
+        service = self._service(monkeypatch, calls)
+        
+        first = service._call_with_retry('Write a blog', temperature=0.7, cache=True)
+        second = service._call_with_retry('Write a blog', temperature=0.7, cache=True)
+        
+        assert first == second
+        assert len(calls) == 1
+    
+    def test_evicts_least_recently_used(self, monkeypatch):
+        clear_response_cache()
+        monkeypatch.setattr('app.services.ai_service._RESPONSE_CACHE_MAX_ENTRIES', 2)
+        calls = []
+        service = self._service(monkeypatch, calls)
+        
+        service._call_with_retry('Analyze keywords', temperature=0.3, cache=True)
+        service._call_with_retry('Analyze competitors', temperature=0.3, cache=True)
+        service._call_with_retry('Analyze keywords', temperature=0.3, cache=True)  # hit, now most recent
+        service._call_with_retry('Analyze reviews', temperature=0.3, cache=True)  # evicts competitors
+        service._call_with_retry('Analyze keywords', temperature=0.3, cache=True)
+        service._call_with_retry('Analyze competitors', temperature=0.3, cache=True)
+        
+        assert calls == ['Analyze keywords', 'Analyze competitors', 'Analyze reviews', 'Analyze competitors']
+    
+    def test_concurrent_access_is_safe(self, monkeypatch):
+        clear_response_cache()
+        monkeypatch.setattr('app.services.ai_service._RESPONSE_CACHE_MAX_ENTRIES', 4)
+        calls = []
+        service = self._service(monkeypatch, calls)
+        
+        def worker(n):
+            for i in range(200):
+                service._call_with_retry(f'Analyze {(n + i) % 8}', temperature=0.3, cache=True)
+        
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        assert len(_RESPONSE_CACHE) <= 4
+    
+    def test_analysis_agent_is_fresh_unless_opted_in(self, monkeypatch):
+        clear_response_cache()
+        calls = []
+        service = self._service(monkeypatch, calls)
+        monkeypatch.setattr(service, '_agent_call_kwargs', lambda name, variables: {
+            'max_tokens': 2000, 'system_prompt': 'Analyze.', 'temperature': 0.2})
+        
+        service.generate_with_agent('seo_analyzer', 'example.com')
+        service.generate_with_agent('seo_analyzer', 'example.com')
+        service.generate_with_agent('seo_analyzer', 'example.com', cache=True)
+        service.generate_with_agent('seo_analyzer', 'example.com', cache=True)
+        
+        assert len(calls) == 3
+    
+    def test_blog_cache_is_opt_in_and_drops_rejected_responses(self, monkeypatch):
+        clear_response_cache()
+        calls = []
+        service = self._service(monkeypatch, calls)
+        
+        service.generate_blog_post('ac repair', 'Tampa, FL', 'hvac', cache=True)
+        service.generate_blog_post('ac repair', 'Tampa, FL', 'hvac', cache=True)
+        
+        # 'response 1' fails blog validation, so it is not replayed
+        assert len(calls) == 2
+        
+        body = '<h2>AC Repair</h2><p>' + 'Cool air for every home in Tampa. ' * 20 + '</p>'
+        
+        def fake_blog_call(prompt, max_tokens, **kwargs):
+            calls.append('ok')
+            return {'content': json.dumps({'title': 'AC Repair', 'body': body}), 'usage': {}, 'stop_reason': 'end_turn'}
+        
+        monkeypatch.setattr(service, '_call_anthropic', fake_blog_call)
+        service.generate_blog_post('ac repair', 'Tampa, FL', 'hvac', cache=True)
+        service.generate_blog_post('ac repair', 'Tampa, FL', 'hvac', cache=True)
+        service.generate_blog_post('ac repair', 'Tampa, FL', 'hvac')
+        
+        assert calls.count('ok') == 2